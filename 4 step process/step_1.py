@@ -1,22 +1,38 @@
 # STEP 1
-# # organize_cursor_history.py v1.7
+# # organize_cursor_history.py v1.9
 # Copies the Cursor history files into a more organized structure based on the date/time of the history file.
-# Usage: python3 step_1.py
+# Usage: python3 step_1.py [scan_workers] [--dedup | --hardlink]
+# Set CURSOR_RECOVERY_VERBOSITY=2 for a line per copied file.
 import os
-import shutil
-import json
-import time
-from datetime import datetime, timezone
+import sys
 
-VERSION = "1.7"
+# The History catalog lives in the main tool, one folder up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cursor_history import HISTORY_SCAN_WORKERS, build_history_index, copy_version, timestamp_folder_name
+from cursor_metrics import METRICS
+from cursor_store import ContentStore
 
-# Path to the Cursor history directory
-import os
+VERSION = "1.9"
 
+# Path to the Cursor history directory
 HISTORY_ROOT = os.path.expanduser("~/Library/Application Support/Cursor/User/History/")
 OUTPUT_ROOT = os.path.expanduser("~/CursorRecovery")
 OUTPUT_ROOT_ORGANIZED = os.path.join(OUTPUT_ROOT, "Organized")
 
+ARGS = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+FLAGS = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+
+# Number of threads scanning History folders (1 = serial)
+SCAN_WORKERS = int(ARGS[0]) if ARGS else HISTORY_SCAN_WORKERS
+
+# --dedup keeps each unique content once in ~/CursorRecovered/_store and clones
+# it into place (copying where clones are unsupported); --hardlink links instead
+STORE = None
+if "--hardlink" in FLAGS:
+    STORE = ContentStore(link_mode="hardlink")
+elif "--dedup" in FLAGS:
+    STORE = ContentStore()
+
 print(f"\n🚀 Running organize_cursor_history.py v{VERSION}\n")
 print(f"🔍 Checking history folder: {HISTORY_ROOT}")
 
@@ -24,48 +40,16 @@ print(f"🔍 Checking history folder: {HISTORY_ROOT}")
 os.makedirs(OUTPUT_ROOT, exist_ok=True)
 os.makedirs(OUTPUT_ROOT_ORGANIZED, exist_ok=True)
 
-# Iterate over each history folder
-for folder_name in os.listdir(HISTORY_ROOT):
-    folder_path = os.path.join(HISTORY_ROOT, folder_name)
-
-    if not os.path.isdir(folder_path):
-        continue  # Skip non-directory items
-
-    json_file = os.path.join(folder_path, "entries.json")
-
-    if not os.path.exists(json_file):
-        continue  # Skip folders without entries.json
-
-    print(f"\n📄 Found entries.json in: {folder_path}")
-
-    # Load JSON data
-    with open(json_file, "r") as f:
-        data = json.load(f)
-
-    if "resource" not in data or "entries" not in data or not data["entries"]:
-        print(f"⚠️ Skipping {folder_name} (No valid entries)")
-        continue
-
-    # Extract correct filename from `resource`
-    resource_path = data["resource"]
-    correct_filename = os.path.basename(resource_path)  # Extract filename only
-
-    # Process each file version separately
-    for entry in data["entries"]:
-        original_filename = entry.get("id")  # e.g., "merm.swift"
-        timestamp = entry.get("timestamp")
-
-        if not original_filename or not timestamp:
-            continue  # Skip invalid entries
-
-        original_path = os.path.join(folder_path, original_filename)
+# Read the History folders through the shared catalog: only folders whose
+# entries.json changed since the last run are parsed again
+index = build_history_index(history_path=HISTORY_ROOT, workers=SCAN_WORKERS)
 
-        if not os.path.exists(original_path):
-            print(f"❌ Missing expected file: {original_path}")
-            continue
+with METRICS.stage("organize"):
+    for version in index:
+        correct_filename = os.path.basename(version.resource)  # Extract filename only
 
         # Generate unique timestamp for each file
-        timestamp_str = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime("%Y%m%d_%H%M%S")
+        timestamp_str = timestamp_folder_name(version.timestamp)
 
         # Target folder for this file's specific timestamp
         target_folder = os.path.join(OUTPUT_ROOT_ORGANIZED, timestamp_str)
@@ -81,11 +65,15 @@ for folder_name in os.listdir(HISTORY_ROOT):
             new_path = os.path.join(target_folder, f"{name_part}.{counter}{ext}")
             counter += 1
 
-        # Copy the file while preserving timestamps
-        shutil.copy2(original_path, new_path)
+        # Copies with timestamps preserved, or clones from STORE
+        copy_version(version, new_path, STORE)
+        METRICS.detail(f"✅ Copied {version.entry_id} → {os.path.basename(new_path)} in {target_folder}")
 
-        print(f"✅ Copied {original_filename} → {os.path.basename(new_path)} in {target_folder}")
+if STORE:
+    STORE.print_stats()
+    STORE.close()
 
+METRICS.print_summary()
 print("\n✅ Done! Organized history saved in:", OUTPUT_ROOT_ORGANIZED)
 print("\n📂 Start with the folder whose date/time matches your last known good code.")
 print("🔍 Compare each file with your current version.")
@@ -1,14 +1,19 @@
 # STEP 2
-# extract_full_composer_blob.py v1.3
+# extract_full_composer_blob.py v1.4
 # Copies the largest composerData blob from the Cursor database to a binary file.
 # Usage: python3 step_2.py
 # Extracts all large composerData blobs (>2KB) from the Cursor database
+# Set CURSOR_RECOVERY_VERBOSITY=2 for a line per saved blob.
 
 import os
-import sqlite3
-from pathlib import Path
+import sys
 
-print("🚀 Running extract_large_composer_blobs.py v2.1")
+# Blob streaming helpers live in the main tool, one folder up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cursor_db import BLOB_CHUNK_SIZE, connect, iter_composer_keys, open_value_stream
+from cursor_metrics import METRICS
+
+print("🚀 Running extract_large_composer_blobs.py v2.2")
 
 # Correct and original path (unchanged!)
 db_path = os.path.expanduser("~/Library/Application Support/Cursor/User/globalStorage/state.vscdb")
@@ -19,35 +24,42 @@ min_size = 2048  # Minimum blob size in bytes
 os.makedirs(output_dir, exist_ok=True)
 
 try:
-    conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-    conn.text_factory = bytes
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT key, value
-        FROM cursorDiskKV
-        WHERE key LIKE 'composerData:%'
-    """)
+    # Read-only, so a running Cursor is never blocked
+    conn = connect(db_path)
 
     count = 0
 
-    for key, value in cursor.fetchall():
-        if isinstance(key, bytes):
-            key = key.decode("utf-8")
+    # Keys come off a streaming cursor and each value is copied to disk in
+    # chunks, so only one chunk of one blob is in memory at a time
+    with METRICS.stage("extract"):
+        for key in iter_composer_keys(conn):
+            stream = open_value_stream(conn, key)
+            try:
+                size = len(stream)
+                if size < min_size:
+                    continue
 
-        if isinstance(value, bytes) and len(value) >= min_size:
-            safe_key = key.replace(":", "_")
-            output_path = os.path.join(output_dir, f"{safe_key}.bin")
-            with open(output_path, "wb") as f:
-                f.write(value)
+                safe_key = key.replace(":", "_")
+                output_path = os.path.join(output_dir, f"{safe_key}.bin")
+                with open(output_path, "wb") as f:
+                    while True:
+                        chunk = stream.read(BLOB_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+            finally:
+                stream.close()
 
-            print(f"✅ Saved {safe_key} ({len(value)} bytes) → {output_path}")
+            METRICS.count("files copied")
+            METRICS.count("bytes copied", size)
+            METRICS.detail(f"✅ Saved {safe_key} ({size} bytes) → {output_path}")
             count += 1
 
     if count == 0:
         print(f"⚠️ No composerData blobs over {min_size} bytes found.")
     else:
         print(f"\n📦 Done! {count} large composerData blobs saved to:\n{output_dir}")
+    METRICS.print_summary()
 
 except Exception as e:
     print(f"❌ Error: {e}")
@@ -0,0 +1,235 @@
+# make_profile.py v1.0
+# Builds a synthetic Cursor profile for benchmarking: a History tree and a
+# state.vscdb whose composerData blobs range from a few KB up to GB.
+# Usage: python3 make_profile.py HOME [options]   (see --help)
+#
+# Files land where the tool looks for them under HOME, so running anything
+# with HOME pointing there (the benchmark harness does) reads the fake profile.
+
+import os
+import sys
+import json
+import random
+import shutil
+import sqlite3
+import argparse
+
+# Where Cursor keeps its user data under HOME; the tool only reads the
+# macOS location, so that is the only layout built
+USER_DIR = os.path.join("Library", "Application Support", "Cursor", "User")
+
+# Every generated timestamp falls in this window, History and chat alike, so
+# joins between the two have work to do
+BASE_TIME_MS = 1700000000000
+SPAN_MS = 30 * 24 * 3600 * 1000
+
+# Bytes written to a blob per step
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+WORDS = (
+    "def class return import self value config parse load save index file path "
+    "error timestamp blob history version cursor recover session message the a of"
+).split()
+
+
+def parse_size(text):
+    # "4K", "1.5M", "2G" or plain bytes
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def random_text(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size].ljust(size)
+
+
+# --- History ---
+def make_history(history_path, folders, versions, file_size, duplication, rng):
+    # folders resources with versions saved versions each. With probability
+    # duplication a version repeats the content of an earlier version of the
+    # same file (what an undo or a reverted AI edit leaves behind).
+    written = 0
+    for i in range(folders):
+        folder = os.path.join(history_path, f"{i:08x}")
+        os.makedirs(folder)
+        resource = f"file:///Users/bench/project/src/pkg{i % 17}/module_{i}.py"
+        contents = []
+        entries = []
+        stamps = sorted(BASE_TIME_MS + rng.randrange(SPAN_MS) for _ in range(versions))
+        for v, ts in enumerate(stamps):
+            if contents and rng.random() < duplication:
+                content = rng.choice(contents)
+            else:
+                content = f"# {resource} v{v}\n" + random_text(rng, file_size) + "\n"
+                contents.append(content)
+            entry_id = f"{rng.getrandbits(32):08x}.py"
+            with open(os.path.join(folder, entry_id), "w") as f:
+                f.write(content)
+            written += len(content)
+            entries.append({"id": entry_id, "timestamp": ts})
+        with open(os.path.join(folder, "entries.json"), "w") as f:
+            json.dump({"version": 1, "resource": resource, "entries": entries}, f)
+    return written
+
+
+# --- Database ---
+# Distinct message texts per session; drawing from a pool keeps GB blobs quick to build
+TEXT_POOL_SIZE = 64
+
+
+def message_json(number, text, ts):
+    # Fixed width fields, so every message of a session has the same length
+    # and blob sizes can be hit without building the blob first
+    return json.dumps({
+        "type": 1 if number % 2 == 0 else 2,
+        "bubbleId": f"b{number:012d}",
+        "text": text,
+        "timingInfo": {"clientStartTime": ts},
+    })
+
+
+def text_pool(rng, text_size):
+    return [random_text(rng, text_size) for _ in range(TEXT_POOL_SIZE)]
+
+
+def blob_sizes(composers, min_size, max_size):
+    # Geometric spread from min_size to max_size, one size per composer
+    if composers == 1:
+        return [max_size]
+    ratio = (max_size / min_size) ** (1 / (composers - 1))
+    return [int(min_size * ratio ** i) for i in range(composers)]
+
+
+def write_composer(conn, composer_id, target_size, text_size, rng):
+    # Inline layout: every message in the composerData blob. The value is
+    # allocated as a zeroblob and filled in chunks, so a GB blob never sits
+    # in memory.
+    head = f'{{"composerId": "{composer_id}", "name": "bench {composer_id}", "conversation": ['
+    tail = "]}"
+    texts = text_pool(rng, text_size)
+    sample = message_json(0, texts[0], BASE_TIME_MS)
+    count = max(1, (target_size - len(head) - len(tail) + 1) // (len(sample) + 1))
+    size = len(head) + len(tail) + count * (len(sample) + 1) - 1
+
+    cursor = conn.execute("INSERT INTO cursorDiskKV (key, value) VALUES (?, zeroblob(?))",
+                          (f"composerData:{composer_id}", size))
+    start = BASE_TIME_MS + rng.randrange(SPAN_MS // 2)
+    step = max(1, (SPAN_MS // 2) // count)
+    with conn.blobopen("cursorDiskKV", "value", cursor.lastrowid) as blob:
+        buffer = [head]
+        buffered = len(head)
+        for n in range(count):
+            piece = ("," if n else "") + message_json(n, rng.choice(texts), start + n * step)
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= WRITE_CHUNK_SIZE:
+                blob.write("".join(buffer).encode("ascii"))
+                buffer, buffered = [], 0
+        buffer.append(tail)
+        blob.write("".join(buffer).encode("ascii"))
+    return size, count
+
+
+def write_bubble_composer(conn, composer_id, messages, text_size, rng):
+    # Newer layout: headers only in composerData, one bubbleId row per message
+    headers = [{"bubbleId": f"b{n:012d}", "type": 1 if n % 2 == 0 else 2} for n in range(messages)]
+    value = json.dumps({"composerId": composer_id, "fullConversationHeadersOnly": headers, "conversation": []})
+    conn.execute("INSERT INTO cursorDiskKV (key, value) VALUES (?, ?)", (f"composerData:{composer_id}", value))
+    size = len(value)
+    texts = text_pool(rng, text_size)
+    start = BASE_TIME_MS + rng.randrange(SPAN_MS // 2)
+    for n in range(messages):
+        bubble = message_json(n, rng.choice(texts), start + n * 60000)
+        conn.execute("INSERT INTO cursorDiskKV (key, value) VALUES (?, ?)",
+                     (f"bubbleId:{composer_id}:b{n:012d}", bubble))
+        size += len(bubble)
+    return size
+
+
+def make_database(db_path, composers, min_blob, max_blob, bubble_sessions, messages, text_size, duplication, rng):
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE ItemTable (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)")
+    conn.execute("CREATE TABLE cursorDiskKV (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)")
+
+    written = 0
+    sizes = blob_sizes(composers, min_blob, max_blob) if composers else []
+    keys = []
+    for i, target in enumerate(sizes):
+        composer_id = f"{rng.getrandbits(64):016x}-{i:04d}"
+        key = f"composerData:{composer_id}"
+        # Duplicated sessions (a chat forked or restored by Cursor) repeat an
+        # earlier, smaller blob byte for byte under a new id; SQLite copies
+        # the value itself, so it never passes through memory. The largest
+        # is always kept.
+        if 0 < i < len(sizes) - 1 and rng.random() < duplication:
+            source = rng.choice(keys)
+            conn.execute("INSERT INTO cursorDiskKV (key, value) SELECT ?, value FROM cursorDiskKV WHERE key = ?",
+                         (key, source))
+            conn.commit()
+            size = conn.execute("SELECT length(value) FROM cursorDiskKV WHERE key = ?", (key,)).fetchone()[0]
+            print(f"💬 {key}: copy of {source}, {size} bytes")
+        else:
+            size, count = write_composer(conn, composer_id, target, text_size, rng)
+            conn.commit()
+            print(f"💬 {key}: {count} messages, {size} bytes")
+        keys.append(key)
+        written += size
+
+    for i in range(bubble_sessions):
+        composer_id = f"{rng.getrandbits(64):016x}-b{i:03d}"
+        written += write_bubble_composer(conn, composer_id, messages, text_size, rng)
+        conn.commit()
+    conn.close()
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build a synthetic Cursor profile for benchmarks.")
+    parser.add_argument("home", help="fake HOME to build the profile in (replaced if it exists)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--folders", type=int, default=200, help="History folders, one per file (default: 200)")
+    parser.add_argument("--versions", type=int, default=20, help="versions per History folder (default: 20)")
+    parser.add_argument("--file-size", type=parse_size, default=4096, help="bytes per version (default: 4K)")
+    parser.add_argument("--duplication", type=float, default=0.3,
+                        help="share of versions and sessions repeating earlier content, 0-1 (default: 0.3)")
+    parser.add_argument("--composers", type=int, default=8, help="inline composerData sessions (default: 8)")
+    parser.add_argument("--min-blob", type=parse_size, default=4096, help="smallest composerData blob (default: 4K)")
+    parser.add_argument("--max-blob", type=parse_size, default=16 * 1024 ** 2,
+                        help="largest composerData blob, e.g. 1G (default: 16M)")
+    parser.add_argument("--bubble-sessions", type=int, default=4,
+                        help="sessions stored as one bubbleId row per message (default: 4)")
+    parser.add_argument("--messages", type=int, default=200, help="messages per bubble session (default: 200)")
+    parser.add_argument("--message-size", type=parse_size, default=512, help="text bytes per message (default: 512)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    user_dir = os.path.join(args.home, USER_DIR)
+    if os.path.exists(user_dir):
+        shutil.rmtree(user_dir)
+    rng = random.Random(args.seed)
+
+    print(f"🏗️ Building profile in: {user_dir}")
+    history_bytes = make_history(os.path.join(user_dir, "History"), args.folders, args.versions,
+                                 args.file_size, args.duplication, rng)
+    print(f"🗂️ History: {args.folders} folders × {args.versions} versions, {history_bytes} bytes")
+    db_bytes = make_database(os.path.join(user_dir, "globalStorage", "state.vscdb"), args.composers,
+                             args.min_blob, args.max_blob, args.bubble_sessions, args.messages,
+                             args.message_size, args.duplication, rng)
+    print(f"🗄️ state.vscdb: {args.composers + args.bubble_sessions} sessions, {db_bytes} bytes of values")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
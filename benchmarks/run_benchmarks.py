@@ -0,0 +1,371 @@
+# run_benchmarks.py v1.0
+# Times every stage of the tool against a synthetic profile from make_profile.py
+# and records wall time, peak RSS and bytes written for each.
+# Usage: python3 run_benchmarks.py HOME [options]   (see --help)
+#
+# Each benchmark runs in a fresh process with HOME pointing at the profile, so
+# the tool's own default paths are used and peak RSS is the stage's alone.
+# Setup (building an index the stage is given, running earlier step scripts)
+# happens in that process before the clock starts.
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import runpy
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from make_profile import USER_DIR
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STEPS_DIR = os.path.join(PACKAGE_DIR, "4 step process")
+
+# Slowdown (or memory growth) over the baseline that counts as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+# --- Benchmarks ---
+# Each returns the callable to time; anything done before returning is setup.
+def bench_history_index_cold():
+    from cursor_history import HISTORY_CATALOG, build_history_index
+    if os.path.exists(HISTORY_CATALOG):
+        os.remove(HISTORY_CATALOG)
+    return build_history_index
+
+
+def bench_history_index_warm():
+    from cursor_history import build_history_index
+    build_history_index()
+    return build_history_index
+
+
+def bench_organize_history_folders():
+    from cursor_history import build_history_index, organize_history_folders
+    index = build_history_index()
+    return lambda: organize_history_folders(index=index)
+
+
+def bench_organize_dedup():
+    from cursor_history import build_history_index, organize_history_folders
+    from cursor_store import STORE_PATH, ContentStore
+    index = build_history_index()
+    if os.path.exists(STORE_PATH):
+        shutil.rmtree(STORE_PATH)
+
+    def run():
+        with ContentStore() as store:
+            organize_history_folders(index=index, store=store)
+    return run
+
+
+def bench_recover_files_up_to():
+    from datetime import datetime
+    from cursor_history import build_history_index, recover_files_up_to
+    index = build_history_index()
+    return lambda: recover_files_up_to(datetime.now(), index=index)
+
+
+def bench_write_pack():
+    from cursor_history import build_history_index
+    from cursor_pack import write_pack
+    index = build_history_index()
+    return lambda: write_pack(index)
+
+
+def bench_read_pack():
+    # Rebuilds every version in the pack, each file oldest first
+    from cursor_history import build_history_index
+    from cursor_pack import VersionPack, pack_is_current, write_pack
+    index = build_history_index()
+    if not pack_is_current(index):
+        write_pack(index)
+
+    def read_all():
+        with VersionPack() as pack:
+            for resource in pack.resources():
+                for version in pack.versions(resource):
+                    pack.read(version)
+    return read_all
+
+
+def bench_extract_largest_blob_to_temp_json():
+    from cursor_db import extract_largest_blob_to_temp_json
+    return extract_largest_blob_to_temp_json
+
+
+def bench_load_largest():
+    # What "Load Database" does without the GUI: stream the largest session
+    from contextlib import closing
+    from cursor_db import iter_largest_conversation, timeline_entries
+
+    def run():
+        with closing(iter_largest_conversation(use_backup=None)) as items:
+            return sum(1 for _ in timeline_entries(items))
+    return run
+
+
+def bench_load_all_timelines():
+    from cursor_cache import CACHE_PATH
+    from cursor_db import load_all_timelines
+    if os.path.exists(CACHE_PATH):
+        shutil.rmtree(CACHE_PATH)
+    return lambda: load_all_timelines(use_backup=None)
+
+
+def bench_load_all_timelines_cached():
+    # Every session unchanged since the last load: read back from the timeline cache
+    from cursor_db import load_all_timelines
+    load_all_timelines(use_backup=None)
+    return lambda: load_all_timelines(use_backup=None)
+
+
+def bench_cli_pipeline():
+    from cursor_recovery_cli import main
+
+    def run():
+        if main(["timeline"]) != 0:
+            raise RuntimeError("cursor_recovery_cli.py failed")
+    return run
+
+
+def step_runner(number, *args):
+    path = os.path.join(STEPS_DIR, f"step_{number}.py")
+
+    def run():
+        sys.argv = [path, *args]
+        try:
+            runpy.run_path(path, run_name="__main__")
+        except SystemExit:
+            pass
+    return run
+
+
+def ensure_step_output(number):
+    # Steps 3 and 4 read what the step before wrote; run it (untimed) if needed
+    extracted = os.path.expanduser("~/CursorRecovery/Extracted")
+    if number >= 3:
+        blob_path = os.path.join(extracted, "full_composer_blob.bin")
+        if not os.path.exists(blob_path):
+            step_runner(2)()
+            # By hand, users rename the largest extracted blob for step 3
+            blobs = [os.path.join(extracted, n) for n in os.listdir(extracted) if n.endswith(".bin")]
+            shutil.copyfile(max(blobs, key=os.path.getsize), blob_path)
+    if number >= 4 and not os.path.exists(os.path.join(extracted, "full_composer_blob_decoded.json")):
+        step_runner(3)()
+
+
+def bench_step(number):
+    def setup():
+        ensure_step_output(number)
+        return step_runner(number)
+    return setup
+
+
+BENCHMARKS = {
+    "history_index_cold": bench_history_index_cold,
+    "history_index_warm": bench_history_index_warm,
+    "organize_history_folders": bench_organize_history_folders,
+    "organize_dedup": bench_organize_dedup,
+    "recover_files_up_to": bench_recover_files_up_to,
+    "write_pack": bench_write_pack,
+    "read_pack": bench_read_pack,
+    "extract_largest_blob_to_temp_json": bench_extract_largest_blob_to_temp_json,
+    "load_largest": bench_load_largest,
+    "load_all_timelines": bench_load_all_timelines,
+    "load_all_timelines_cached": bench_load_all_timelines_cached,
+    "cli_pipeline": bench_cli_pipeline,
+    "step_1": bench_step(1),
+    "step_2": bench_step(2),
+    "step_3": bench_step(3),
+    "step_4": bench_step(4),
+}
+
+
+# --- Measuring (in the benchmark process) ---
+class CountingWriter(io.TextIOBase):
+    # Stands in for stdout so the tool's own output can be told apart from the
+    # bytes it writes to disk
+    def __init__(self, target):
+        self.target = target
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text.encode("utf-8", "replace"))
+        return self.target.write(text)
+
+    def flush(self):
+        self.target.flush()
+
+
+def bytes_written_so_far():
+    # Bytes passed to write() by this process (Linux only)
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def peak_rss_bytes():
+    # Largest resident set of this process or any worker it waited for;
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return scale * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+def run_child(name, result_path, show_output):
+    sys.path.insert(0, PACKAGE_DIR)
+    os.chdir(os.path.expanduser("~"))
+    sink = open(os.devnull, "w") if not show_output else sys.__stdout__
+    out = CountingWriter(sink)
+    sys.stdout = out
+
+    result = {"name": name, "error": None}
+    try:
+        func = BENCHMARKS[name]()
+        out.flush()
+        out.bytes = 0
+        written_before = bytes_written_so_far()
+        start = time.perf_counter()
+        func()
+        result["wall_s"] = time.perf_counter() - start
+        out.flush()
+        written_after = bytes_written_so_far()
+        if written_before is not None:
+            result["bytes_written"] = written_after - written_before - out.bytes
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdout = sys.__stdout__
+    result["peak_rss"] = peak_rss_bytes()
+    result["stdout_bytes"] = out.bytes
+
+    with open(result_path, "w") as f:
+        json.dump(result, f)
+
+
+# --- Harness ---
+def run_benchmark(name, home, show_output):
+    fd, result_path = tempfile.mkstemp(prefix="bench_", suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, HOME=home, TMPDIR=os.path.join(home, "tmp"))
+    os.makedirs(env["TMPDIR"], exist_ok=True)
+    try:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), home, "--child", name, "--result", result_path]
+            + (["--show-output"] if show_output else []),
+            env=env,
+            check=False,
+            stdout=None if show_output else subprocess.DEVNULL,
+        )
+        with open(result_path) as f:
+            content = f.read()
+        return json.loads(content) if content else {"name": name, "error": "benchmark process failed"}
+    finally:
+        os.remove(result_path)
+
+
+def best_of(runs):
+    # Fastest successful run, with the highest peak RSS seen across all of them
+    good = [r for r in runs if not r["error"]] or runs
+    best = dict(min(good, key=lambda r: r.get("wall_s", float("inf"))))
+    best["peak_rss"] = max(r["peak_rss"] for r in runs)
+    best["runs"] = len(runs)
+    return best
+
+
+def format_bytes(n):
+    if n is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def print_table(results, baseline=None, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    print(f"\n{'benchmark':36} {'wall':>10} {'peak RSS':>10} {'written':>10}")
+    for r in results:
+        if r["error"]:
+            print(f"{r['name']:36} ❌ {r['error']}")
+            continue
+        note = ""
+        old = (baseline or {}).get(r["name"])
+        if old and not old.get("error"):
+            slower = r["wall_s"] / old["wall_s"] - 1 if old["wall_s"] else 0
+            bigger = r["peak_rss"] / old["peak_rss"] - 1 if old["peak_rss"] else 0
+            note = f"  {slower:+.0%} time, {bigger:+.0%} RSS"
+            if slower > threshold or bigger > threshold:
+                note += "  ⚠️ regression"
+                regressions.append(r["name"])
+        print(f"{r['name']:36} {r['wall_s']:>9.3f}s {format_bytes(r['peak_rss']):>10} "
+              f"{format_bytes(r.get('bytes_written')):>10}{note}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every stage against a synthetic profile.")
+    parser.add_argument("home", help="fake HOME built by make_profile.py")
+    parser.add_argument("--only", help=f"comma-separated benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per benchmark; the fastest is kept (default: 1)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to save the results")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help=f"growth in time or RSS reported as a regression (default: {REGRESSION_THRESHOLD})")
+    parser.add_argument("--show-output", action="store_true", help="let the stages print as they run")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        run_child(args.child, args.result, args.show_output)
+        return 0
+
+    home = os.path.abspath(args.home)
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        print(f"❌ Unknown benchmark: {', '.join(unknown)}")
+        return 2
+    if not os.path.isdir(os.path.join(home, USER_DIR)):
+        print(f"❌ No profile in {home}; build one with: python3 make_profile.py {home}")
+        return 2
+
+    results = []
+    for name in names:
+        print(f"⏱️ {name}...")
+        results.append(best_of([run_benchmark(name, home, args.show_output) for _ in range(args.repeat)]))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r["name"]: r for r in json.load(f)["results"]}
+    regressions = print_table(results, baseline, args.threshold)
+
+    with open(args.output, "w") as f:
+        json.dump({"home": home, "python": sys.version.split()[0], "platform": sys.platform,
+                   "results": results}, f, indent=2)
+    print(f"\n💾 Results saved to: {args.output}")
+    if regressions:
+        print(f"⚠️ Regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+# cursor_archive.py v1.0
+# Point-in-time snapshots of History streamed straight into a tar or zip
+# archive. Each chosen version is read once from History and written under
+# its reconstructed path (as recover lays it out), one chunk at a time, so
+# nothing is staged on disk and memory stays flat whatever the snapshot size.
+# An optional MANIFEST.json member lists each file's resource URI, save
+# timestamp and SHA-256.
+
+import io
+import os
+import json
+import time
+import zipfile
+import tarfile
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+
+from cursor_history import (
+    FINAL_RECOVERY,
+    HASH_CHUNK_SIZE,
+    VersionTimeline,
+    build_history_index,
+    common_resource_root,
+    recovery_cutoff,
+    select_recovery_files,
+)
+from cursor_metrics import METRICS
+
+# Paths
+EXPORT_PATH = FINAL_RECOVERY + ".tar.gz"
+
+# Archive formats by name or file extension → tarfile stream mode, or "zip"
+ARCHIVE_FORMATS = {
+    "tar": "w|",
+    "tar.gz": "w|gz",
+    "tgz": "w|gz",
+    "tar.bz2": "w|bz2",
+    "tbz2": "w|bz2",
+    "tar.xz": "w|xz",
+    "txz": "w|xz",
+    "zip": "zip",
+}
+
+MANIFEST_NAME = "MANIFEST.json"
+
+# Zip cannot store times before 1980
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def archive_format(archive_path, name=None):
+    # The format named, or else the one the file name ends in
+    if name:
+        if name not in ARCHIVE_FORMATS:
+            raise ValueError(f"unknown archive format {name!r}, expected any of: {', '.join(ARCHIVE_FORMATS)}")
+        return name
+    lower = archive_path.lower()
+    for fmt in sorted(ARCHIVE_FORMATS, key=len, reverse=True):
+        if lower.endswith("." + fmt):
+            return fmt
+    raise ValueError(f"cannot tell the archive format of {archive_path!r}; name it .tar, .tar.gz, .tar.xz or .zip")
+
+
+def archive_prefix(archive_path, fmt):
+    # The folder every member sits in: the archive's name without extension
+    name = os.path.basename(archive_path)
+    if name.lower().endswith("." + fmt):
+        name = name[:-len(fmt) - 1]
+    return name or "snapshot"
+
+
+class _HashingReader:
+    # Passes reads through while hashing them, so each version is read only once
+    def __init__(self, f):
+        self.f = f
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.hash.update(data)
+        self.size += len(data)
+        return data
+
+
+class SnapshotArchive:
+    # Writes members to a tar stream or zip file in order; nothing is seeked
+    # back to, so out may be a pipe such as stdout
+    def __init__(self, out, fmt):
+        self.fmt = fmt
+        if fmt == "zip":
+            self.zip = zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED)
+            self.tar = None
+        else:
+            self.tar = tarfile.open(fileobj=out, mode=ARCHIVE_FORMATS[fmt], format=tarfile.PAX_FORMAT)
+            self.zip = None
+
+    def add_file(self, name, f, size, mtime):
+        # Streams size bytes of f into the member name; returns their SHA-256
+        reader = _HashingReader(f)
+        if self.tar:
+            self.tar.addfile(self._tar_info(name, size, mtime), reader)
+        else:
+            info = self._zip_info(name, mtime)
+            with self.zip.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as dest:
+                while reader.size < size:
+                    data = reader.read(min(HASH_CHUNK_SIZE, size - reader.size))
+                    if not data:
+                        raise OSError(f"{name} shrank while it was archived")
+                    dest.write(data)
+        return reader.hash.hexdigest()
+
+    def add_bytes(self, name, data, mtime):
+        if self.tar:
+            self.tar.addfile(self._tar_info(name, len(data), mtime), io.BytesIO(data))
+        else:
+            self.zip.writestr(self._zip_info(name, mtime), data)
+
+    def close(self):
+        if self.tar:
+            self.tar.close()
+        else:
+            self.zip.close()
+
+    @staticmethod
+    def _tar_info(name, size, mtime):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = mtime
+        info.mode = 0o644
+        return info
+
+    @staticmethod
+    def _zip_info(name, mtime):
+        info = zipfile.ZipInfo(name, max(ZIP_EPOCH, time.localtime(mtime)[:6]))
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        return info
+
+
+def write_archive(seen_files, archive, prefix="", manifest=None, progress=None):
+    # Adds each chosen version under prefix/its path; returns how many were
+    # added. manifest, a dict, gets a "files" list of what was archived.
+    files = []
+    total = len(seen_files)
+    for done, (file_name, version) in enumerate(sorted(seen_files.items()), 1):
+        name = "/".join(filter(None, [prefix] + file_name.split(os.sep)))
+        try:
+            with open(version.source_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                digest = archive.add_file(name, f, size, version.timestamp / 1000)
+        except FileNotFoundError:
+            METRICS.count("versions skipped")
+            print(f"❌ Source file missing: {version.source_path}")
+            continue
+        METRICS.count("files archived")
+        METRICS.count("bytes archived", size)
+        METRICS.detail(f"📦 Archived: {name} (from {datetime.fromtimestamp(version.timestamp / 1000)})")
+        files.append({
+            "path": name,
+            "resource": version.resource,
+            "timestamp": version.timestamp,
+            "size": size,
+            "sha256": digest,
+        })
+        if progress:
+            progress("files archived", done, total)
+
+    if manifest is not None:
+        manifest["files"] = files
+        data = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+        archive.add_bytes("/".join(filter(None, [prefix, MANIFEST_NAME])), data, time.time())
+    return len(files)
+
+
+@METRICS.stage("export")
+def export_snapshot(recovery_time, archive_path=None, index=None, project_name=None, timeline=None,
+                    cutoff=None, fmt=None, with_manifest=True, out=None, progress=None):
+    # The files recover_files_up_to would write, as one archive instead.
+    # out, a binary stream such as stdout, is written instead of archive_path
+    # (fmt is then required). A file is written under a temp name and
+    # renamed, so a failed export leaves no partial archive behind.
+    archive_path = archive_path or EXPORT_PATH
+    fmt = archive_format("" if out else archive_path, fmt)
+    cutoff = recovery_cutoff(recovery_time) if cutoff is None else cutoff
+    if timeline is None:
+        if index is None:
+            index = build_history_index(project_name, progress=progress)
+        timeline = VersionTimeline(index)
+
+    METRICS.info(f"\n✅ Exporting snapshot at: {recovery_time}")
+    seen_files = select_recovery_files(timeline.at(cutoff), common_resource_root(timeline.versions))
+    prefix = "snapshot" if out else archive_prefix(archive_path, fmt)
+    manifest = None
+    if with_manifest:
+        manifest = {
+            "cutoff": cutoff,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+
+    if out:
+        archive = SnapshotArchive(out, fmt)
+        count = write_archive(seen_files, archive, prefix, manifest, progress)
+        archive.close()
+        out.flush()
+        return count
+
+    output_dir = os.path.dirname(os.path.abspath(archive_path))
+    os.makedirs(output_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            archive = SnapshotArchive(f, fmt)
+            count = write_archive(seen_files, archive, prefix, manifest, progress)
+            archive.close()
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, archive_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return count
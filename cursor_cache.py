@@ -0,0 +1,157 @@
+# cursor_cache.py v1.2
+# On-disk cache of parsed chat timelines, one file per composer session state.
+# Files are named after the composer key, length and SHA-256 of what the
+# timeline was parsed from, so a session unchanged in any database is read
+# back through mmap with no JSON parsing; only changed sessions are parsed.
+#
+# File layout (little-endian; the 8-byte columns start 8-byte aligned):
+#   header      magic, format version, message count, text and id bytes, length, digest
+#   timestamps  int64 per message, NO_TIMESTAMP where Cursor recorded none
+#   offsets     uint64 per message + 1, into the text region
+#   id offsets  uint64 per message + 1, into the id region ("" for no id)
+#   speakers    uint8 per message, 1 for your messages
+#   text        every message's UTF-8 text, back to back
+#   ids         every message's bubbleId, back to back
+
+import os
+import sys
+import mmap
+import time
+import struct
+import hashlib
+import tempfile
+from array import array
+
+from cursor_metrics import METRICS
+
+# Paths
+CACHE_PATH = os.path.expanduser("~/CursorRecovered/timeline_cache")
+
+# Bump when the layout changes; files in an older format are re-parsed
+CACHE_FORMAT_VERSION = 2
+
+# Files not read for this long are removed by prune(): states of sessions
+# that have changed since, or that were deleted
+CACHE_MAX_AGE_S = 30 * 24 * 3600
+
+MAGIC = b"CRTLCACH"
+HEADER = struct.Struct("<8sIIQQQQ32s")  # magic, version, padding, count, text bytes, id bytes, length, digest
+NO_TIMESTAMP = -1
+
+
+class TimelineCache:
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or CACHE_PATH
+        os.makedirs(self.cache_path, exist_ok=True)
+
+    def path_for(self, key, length, digest):
+        name = hashlib.sha1(f"{key}\0{length}\0{digest.hex()}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_path, name + ".tl")
+
+    def read(self, key, length, digest):
+        # (timestamp, from_user, text, message_id) per message, or None on a miss
+        if sys.byteorder != "little":
+            return None  # Columns are cast in place, which needs the file's byte order
+        path = self.path_for(key, length, digest)
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None  # Missing, or empty (mmap refuses zero-length files)
+
+        try:
+            if len(mm) < HEADER.size:
+                return None
+            magic, version, _, count, text_size, id_size, stored_length, stored_digest = HEADER.unpack_from(mm)
+            if (magic, version, stored_length, stored_digest) != (MAGIC, CACHE_FORMAT_VERSION, length, digest):
+                return None
+            offsets_start = HEADER.size + 8 * count
+            id_offsets_start = offsets_start + 8 * (count + 1)
+            speakers_start = id_offsets_start + 8 * (count + 1)
+            text_start = speakers_start + count
+            ids_start = text_start + text_size
+            if len(mm) != ids_start + id_size:
+                return None  # Truncated or padded: not a file this version wrote
+
+            view = memoryview(mm)
+            columns = [
+                view[HEADER.size:offsets_start].cast("q"),
+                view[offsets_start:id_offsets_start].cast("Q"),
+                view[id_offsets_start:speakers_start].cast("Q"),
+                view[speakers_start:text_start],
+                view[text_start:ids_start],
+                view[ids_start:],
+            ]
+            try:
+                timestamps, offsets, id_offsets, speakers, texts, ids = columns
+                rows = [
+                    (None if timestamps[i] == NO_TIMESTAMP else timestamps[i],
+                     speakers[i] == 1,
+                     str(texts[offsets[i]:offsets[i + 1]], "utf-8", "surrogatepass"),
+                     str(ids[id_offsets[i]:id_offsets[i + 1]], "utf-8", "surrogatepass") or None)
+                    for i in range(count)
+                ]
+            finally:
+                for column in columns:
+                    column.release()
+                view.release()
+        finally:
+            mm.close()
+        # Marks the file as in use, so prune() keeps it
+        os.utime(path)
+        return rows
+
+    def write(self, key, length, digest, entries):
+        # entries are TimelineEntries; written under a temp name and renamed,
+        # so worker processes writing other sessions never see half a file.
+        # Timestamps are stored as whole ms (a float clientStartTime loses its
+        # fraction). Returns False, writing nothing and counting it, when one
+        # is not a number at all; such a session is parsed on every load.
+        try:
+            timestamps = array("q", (NO_TIMESTAMP if e.timestamp is None else int(e.timestamp) for e in entries))
+        except (TypeError, ValueError, OverflowError):
+            METRICS.count("cache writes skipped")
+            return False
+        speakers = bytes(1 if e.from_user else 0 for e in entries)
+        # surrogatepass keeps lone surrogates (an emoji cut in half), which
+        # json.loads accepts but plain UTF-8 cannot encode
+        texts = [e.text.encode("utf-8", "surrogatepass") for e in entries]
+        ids = [str(e.message_id or "").encode("utf-8", "surrogatepass") for e in entries]
+        offsets = array("Q", [0])
+        for text in texts:
+            offsets.append(offsets[-1] + len(text))
+        id_offsets = array("Q", [0])
+        for message_id in ids:
+            id_offsets.append(id_offsets[-1] + len(message_id))
+        header = HEADER.pack(MAGIC, CACHE_FORMAT_VERSION, 0, len(entries), offsets[-1], id_offsets[-1], length, digest)
+        if sys.byteorder != "little":
+            for column in (timestamps, offsets, id_offsets):
+                column.byteswap()
+
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_path, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(timestamps.tobytes())
+                f.write(offsets.tobytes())
+                f.write(id_offsets.tobytes())
+                f.write(speakers)
+                f.writelines(texts)
+                f.writelines(ids)
+            os.replace(temp_path, self.path_for(key, length, digest))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True
+
+    def prune(self, max_age=CACHE_MAX_AGE_S):
+        # Removes files neither written nor read for max_age seconds; returns how many
+        cutoff = time.time() - max_age
+        removed = 0
+        with os.scandir(self.cache_path) as it:
+            for entry in it:
+                if entry.name.endswith(".tl") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
@@ -0,0 +1,748 @@
+# cursor_db.py v1.0
+# Streaming access to the composerData conversations in Cursor's state.vscdb
+
+import os
+import re
+import json
+import codecs
+import sqlite3
+import hashlib
+import tempfile
+from urllib.request import pathname2url
+from collections import namedtuple
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from cursor_cache import TimelineCache
+from cursor_metrics import METRICS
+
+# Paths
+PROFILE_ROOT = os.path.expanduser("~/Library/Application Support/Cursor/User")
+DB_PATH = os.path.join(PROFILE_ROOT, "globalStorage", "state.vscdb")
+DB_PATH_BACKUP = os.path.join(PROFILE_ROOT, "globalStorage", "state.vscdb.backup")
+
+# Bytes pulled from SQLite per read while streaming a blob
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+# Messages parsed between progress reports while loading a single session
+PROGRESS_EVERY = 200
+
+# Processes decoding composer sessions in parallel; 1 decodes in this process
+COMPOSER_WORKERS = os.cpu_count() or 1
+
+# One message in the timeline. timestamp is in ms (inherited from the previous
+# message when Cursor did not record one); composer_id names the chat session
+# and message_id is Cursor's bubbleId for the message, where it has one.
+TimelineEntry = namedtuple("TimelineEntry", ["timestamp", "from_user", "text", "composer_id", "message_id"],
+                           defaults=(None,))
+
+
+# --- Database Access ---
+def connect(db_path):
+    # Read-only URI: never takes a write lock, so a running Cursor is not
+    # blocked, and committed pages still in the -wal file are seen
+    uri = "file:" + pathname2url(os.path.abspath(db_path)) + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, detect_types=sqlite3.PARSE_DECLTYPES, timeout=30)
+    conn.text_factory = bytes
+    return conn
+
+
+def snapshot_database(db_path):
+    # Online backup into a private temp file: one short read transaction on
+    # the live database, then every later query runs against the copy
+    fd, snapshot_path = tempfile.mkstemp(prefix="cursor_state_", suffix=".vscdb")
+    os.close(fd)
+    source = connect(db_path)
+    target = sqlite3.connect(snapshot_path)
+    try:
+        source.backup(target)
+    except BaseException:
+        target.close()
+        os.remove(snapshot_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    return snapshot_path
+
+
+def database_mtime(db_path):
+    # In WAL mode the newest writes land in the -wal file, not the database
+    return max(os.path.getmtime(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+def is_readable_database(db_path, quiet=False):
+    try:
+        conn = connect(db_path)
+        try:
+            conn.execute("SELECT key FROM cursorDiskKV LIMIT 1").fetchall()
+        finally:
+            conn.close()
+        return True
+    except sqlite3.Error as e:
+        if quiet:
+            METRICS.detail(f"⏭️ Skipping {db_path}: {e}")
+        else:
+            print(f"⚠️ Cannot read {db_path}: {e}")
+        return False
+
+
+def choose_database(candidates=None):
+    # The most recently written of the databases that open and hold cursorDiskKV
+    candidates = candidates or (DB_PATH, DB_PATH_BACKUP)
+    usable = [p for p in candidates if os.path.exists(p) and is_readable_database(p)]
+    if not usable:
+        raise Exception("No readable Cursor state database found")
+    return max(usable, key=database_mtime)
+
+
+def resolve_db_path(use_backup=None):
+    # True/False pick the backup/main database; None picks the newest usable one
+    if use_backup is None:
+        return choose_database()
+    return DB_PATH_BACKUP if use_backup else DB_PATH
+
+
+def discover_databases(profile_root=None):
+    # Every state database under the profile that holds chat rows: the global
+    # one, its backup and those of each workspace. Most workspace databases
+    # only hold UI state and are skipped quietly.
+    profile_root = os.path.expanduser(profile_root) if profile_root else PROFILE_ROOT
+    folders = [os.path.join(profile_root, "globalStorage")]
+    workspaces = os.path.join(profile_root, "workspaceStorage")
+    if os.path.isdir(workspaces):
+        folders += [os.path.join(workspaces, name) for name in sorted(os.listdir(workspaces))]
+    candidates = [os.path.join(folder, name) for folder in folders for name in ("state.vscdb", "state.vscdb.backup")]
+    return [p for p in candidates if os.path.isfile(p) and is_readable_database(p, quiet=True)]
+
+
+class StateDatabase:
+    # One read-only connection shared by every query of a load. With
+    # snapshot=True the queries (and any worker processes) read a private copy.
+    def __init__(self, use_backup=None, snapshot=False, db_path=None):
+        self.source_path = db_path or resolve_db_path(use_backup)
+        METRICS.info(f"\n🔍 Opening database: {self.source_path}")
+        self.snapshot_path = snapshot_database(self.source_path) if snapshot else None
+        if self.snapshot_path:
+            METRICS.info(f"📸 Reading from snapshot: {self.snapshot_path}")
+        self.path = self.snapshot_path or self.source_path
+        self.conn = connect(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+
+
+# --- Key Ranges ---
+# LIKE is case-insensitive by default, so SQLite cannot use the key index for
+# it and scans the whole table. A half-open range on the key does use it.
+def prefix_range(prefix):
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def iter_prefixed_rows(conn, prefix):
+    # Yields (key, rowid) for every key starting with prefix, in key order
+    low, high = prefix_range(prefix)
+    for key, rowid in conn.execute(
+        "SELECT key, rowid FROM cursorDiskKV WHERE key >= ? AND key < ? ORDER BY key", (low, high)
+    ):
+        yield key.decode("utf-8") if isinstance(key, bytes) else key, rowid
+
+
+# --- Blob Access ---
+def find_largest_composer_key(conn):
+    if not hasattr(conn, "blobopen"):
+        row = conn.execute("""
+            SELECT key, LENGTH(value) as size
+            FROM cursorDiskKV
+            WHERE key >= ? AND key < ?
+            ORDER BY size DESC
+            LIMIT 1;
+        """, prefix_range("composerData:")).fetchone()
+    else:
+        # LENGTH() on a TEXT value loads the whole value just to count its
+        # characters; a blob handle reports the byte size from the row header
+        row = None
+        for key, rowid in iter_prefixed_rows(conn, "composerData:"):
+            with conn.blobopen("cursorDiskKV", "value", rowid, readonly=True) as blob:
+                size = len(blob)
+            if row is None or size > row[1]:
+                row = (key, size)
+    if not row:
+        raise Exception("No composerData blobs found")
+
+    key, size = row
+    if isinstance(key, bytes):
+        key = key.decode("utf-8")
+    return key, size
+
+
+def open_value_stream(conn, key):
+    row = conn.execute("SELECT rowid FROM cursorDiskKV WHERE key = ?", (key,)).fetchone()
+    if not row:
+        raise Exception(f"Failed to fetch blob data for {key}")
+
+    # Incremental blob I/O (Python 3.11+) reads the value straight from the
+    # database pages, so only one chunk is ever held in memory
+    if hasattr(conn, "blobopen"):
+        return conn.blobopen("cursorDiskKV", "value", row[0], readonly=True)
+
+    # Older Pythons: one bytes copy of the value, read through a memoryview
+    value = conn.execute("SELECT CAST(value AS BLOB) FROM cursorDiskKV WHERE rowid = ?", (row[0],)).fetchone()[0]
+    return _BytesStream(value)
+
+
+class _BytesStream:
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def __len__(self):
+        return len(self.view)
+
+    def read(self, size):
+        chunk = self.view[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        return bytes(chunk)
+
+    def close(self):
+        self.view.release()
+
+
+# --- Streaming JSON ---
+_WHITESPACE = re.compile(r"\s*")
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r"[\s,\]}]")
+
+
+class _JsonStream:
+    # Walks a UTF-8 JSON document one chunk at a time. Text before `pos` is
+    # dropped from the buffer as soon as more input is needed. While `mark`
+    # pins a value that will be decoded, its scanned text is moved to
+    # `pinned` instead, so a value spanning many chunks is copied once
+    # rather than once per chunk.
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.mark = None
+        self.pinned = []
+        self.eof = False
+
+    def more(self):
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.eof = not chunk
+        METRICS.count("json bytes parsed", len(chunk))
+        if self.mark is not None:
+            self.pinned.append(self.buf[self.mark:self.pos])
+            self.mark = 0
+        self.buf = self.buf[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found or 'end of data'!r}")
+        self.pos += 1
+
+    def skip_value(self):
+        # Moves pos past one JSON value without decoding it
+        first = self.peek()
+        if not first:
+            raise ValueError("Unexpected end of data")
+
+        if first not in '{["':
+            # Number, true, false or null
+            while True:
+                m = _SCALAR_END.search(self.buf, self.pos)
+                if m:
+                    self.pos = m.start()
+                    return
+                self.pos = len(self.buf)
+                if not self.more():
+                    return
+
+        depth = 0
+        in_string = False
+        while True:
+            if in_string:
+                m = _STRING_SPECIAL.search(self.buf, self.pos)
+                if m and m.group() == '"':
+                    self.pos = m.end()
+                    in_string = False
+                    if depth == 0:
+                        return
+                    continue
+                if m and m.end() < len(self.buf):
+                    self.pos = m.end() + 1  # Skip the escaped character
+                    continue
+                # Out of text, or a backslash whose escaped character is still unread
+                self.pos = m.start() if m else len(self.buf)
+            else:
+                m = _STRUCTURAL.search(self.buf, self.pos)
+                if m:
+                    self.pos = m.end()
+                    char = m.group()
+                    if char == '"':
+                        in_string = True
+                    elif char in "[{":
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if depth == 0:
+                            return
+                    continue
+                self.pos = len(self.buf)
+
+            if not self.more():
+                raise ValueError("Unexpected end of data")
+
+    def read_value(self):
+        self.peek()
+        self.mark = self.pos
+        self.skip_value()
+        self.pinned.append(self.buf[self.mark:self.pos])
+        text = "".join(self.pinned)
+        self.pinned = []
+        self.mark = None
+        return json.loads(text)
+
+
+def iter_json_arrays(stream, keys, chunk_size=BLOB_CHUNK_SIZE):
+    # Yields (key, item) for the items of the arrays stored under any of `keys`
+    # in a top-level JSON object, one at a time. Memory use is bounded by the
+    # largest single item.
+    parser = _JsonStream(stream, chunk_size)
+    parser.expect("{")
+    if parser.peek() == "}":
+        return
+
+    remaining = set(keys)
+    while True:
+        name = parser.read_value()
+        parser.expect(":")
+
+        if name in remaining and parser.peek() == "[":
+            remaining.discard(name)
+            parser.pos += 1
+            if parser.peek() == "]":
+                parser.pos += 1
+            else:
+                while True:
+                    yield name, parser.read_value()
+                    separator = parser.peek()
+                    parser.pos += 1
+                    if separator == "]":
+                        break
+                    if separator != ",":
+                        raise ValueError(f"Expected ',' or ']' but found {separator or 'end of data'!r}")
+            if not remaining:
+                return  # Nothing after the last wanted array is needed
+        else:
+            parser.skip_value()
+
+        separator = parser.peek()
+        parser.pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or '}}' but found {separator or 'end of data'!r}")
+
+
+def iter_json_array(stream, key, chunk_size=BLOB_CHUNK_SIZE):
+    for _, item in iter_json_arrays(stream, (key,), chunk_size):
+        yield item
+
+
+# --- Conversations ---
+def iter_conversation(conn, key):
+    # Older Cursor builds keep every message inline in the composerData blob.
+    # Newer ones keep only headers there and store each message in its own
+    # bubbleId:<composer>:<bubble> row; both layouts are read here.
+    headers = []
+    inline_ids = set()
+    stream = open_value_stream(conn, key)
+    try:
+        for name, item in iter_json_arrays(stream, ("conversation", "fullConversationHeadersOnly")):
+            if name == "conversation":
+                if isinstance(item, dict) and item.get("bubbleId"):
+                    inline_ids.add(item["bubbleId"])
+                yield item
+            elif isinstance(item, dict) and item.get("bubbleId"):
+                headers.append(item["bubbleId"])
+    finally:
+        stream.close()
+
+    yield from iter_bubbles(conn, composer_id_from_key(key), headers, skip=inline_ids)
+
+
+def iter_bubbles(conn, composer_id, order=(), skip=()):
+    # One index range scan finds every bubble row of the composer; values are
+    # then read one at a time by rowid, in conversation order where known
+    rowids = {}
+    for key, rowid in iter_prefixed_rows(conn, f"bubbleId:{composer_id}:"):
+        bubble_id = key.rsplit(":", 1)[1]
+        if bubble_id not in skip:
+            rowids[bubble_id] = rowid
+    if not rowids:
+        return
+
+    ordered = [bubble_id for bubble_id in order if bubble_id in rowids]
+    ordered_set = set(ordered)
+    ordered += [bubble_id for bubble_id in rowids if bubble_id not in ordered_set]
+
+    for bubble_id in ordered:
+        row = conn.execute("SELECT value FROM cursorDiskKV WHERE rowid = ?", (rowids[bubble_id],)).fetchone()
+        if not row or not row[0]:
+            continue
+        METRICS.count("json bytes parsed", len(row[0]))
+        try:
+            yield json.loads(row[0])
+        except ValueError as e:
+            print(f"⚠️ Skipping unreadable bubble {bubble_id}: {e}")
+
+
+def composer_id_from_key(key):
+    return key.split(":", 1)[1]
+
+
+def iter_composer_keys(conn):
+    # Rows are pulled from the cursor as they are needed, never fetchall()ed
+    for key, _ in iter_prefixed_rows(conn, "composerData:"):
+        yield key
+
+
+def message_timestamp(item):
+    timing_info = item.get("timingInfo") or {}
+    ts = timing_info.get("clientStartTime") or timing_info.get("clientRpcSendTime")
+    if ts:
+        return ts
+
+    # Bubble rows carry an ISO createdAt instead of timingInfo
+    created = item.get("createdAt")
+    if isinstance(created, (int, float)):
+        return created
+    if isinstance(created, str):
+        try:
+            return int(datetime.fromisoformat(created.replace("Z", "+00:00")).timestamp() * 1000)
+        except ValueError:
+            return None
+    return None
+
+
+def timeline_entries(items, composer_id=None):
+    last_valid_ts = None
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+
+        text = item.get("text", "").strip()
+        if not text:
+            continue
+
+        ts = message_timestamp(item)
+        if ts:
+            last_valid_ts = ts
+        yield TimelineEntry(last_valid_ts, item.get("type") == 1, text, composer_id, item.get("bubbleId"))
+
+
+def iter_largest_conversation(use_backup=False, db=None):
+    own_db = db is None
+    db = db or StateDatabase(use_backup)
+    try:
+        with METRICS.stage("load largest"):
+            key, size = find_largest_composer_key(db.conn)
+            METRICS.info(f"📦 Found largest blob: {key} ({size} bytes)")
+            yield from iter_conversation(db.conn, key)
+    finally:
+        if own_db:
+            db.close()
+
+
+# --- Timeline Cache ---
+def session_digest(conn, key):
+    # (length, SHA-256) of everything a session's timeline is parsed from: the
+    # composerData value and, for the bubble layout, every bubbleId row of it.
+    # Reading and hashing is far cheaper than decoding the JSON.
+    h = hashlib.sha256()
+    length = 0
+    stream = open_value_stream(conn, key)
+    try:
+        for chunk in iter(lambda: stream.read(BLOB_CHUNK_SIZE), b""):
+            h.update(chunk)
+            length += len(chunk)
+    finally:
+        stream.close()
+    for bubble_key, rowid in iter_prefixed_rows(conn, f"bubbleId:{composer_id_from_key(key)}:"):
+        value = conn.execute("SELECT CAST(value AS BLOB) FROM cursorDiskKV WHERE rowid = ?", (rowid,)).fetchone()[0]
+        h.update(bubble_key.encode("utf-8") + b"\0" + (value or b"") + b"\0")
+        length += len(value or b"")
+    return length, h.digest()
+
+
+def report_progress(items, progress, stage="messages parsed", every=PROGRESS_EVERY):
+    # Passes items through, calling progress(stage, done, 0) every `every`
+    # items (the total is not known up front); an exception raised from it
+    # stops the parse
+    done = 0
+    try:
+        for item in items:
+            yield item
+            done += 1
+            if done % every == 0:
+                progress(stage, done, 0)
+    finally:
+        # Release the blob stream now, while its connection is still open
+        if hasattr(items, "close"):
+            items.close()
+
+
+def session_timeline(conn, key, composer_id=None, cache=None, progress=None):
+    # Every message of one session as TimelineEntries. With a TimelineCache,
+    # an unchanged session is read back from it and a changed one is parsed
+    # and stored for next time. progress, if given, is told how far the
+    # parse has got (see report_progress).
+    items = iter_conversation(conn, key)
+    if progress:
+        items = report_progress(items, progress)
+    if cache is None:
+        return list(timeline_entries(items, composer_id))
+    length, digest = session_digest(conn, key)
+    rows = cache.read(key, length, digest)
+    if rows is not None:
+        METRICS.count("sessions from cache")
+        return [TimelineEntry(ts, from_user, text, composer_id, message_id) for ts, from_user, text, message_id in rows]
+    entries = list(timeline_entries(items, composer_id))
+    try:
+        cache.write(key, length, digest, entries)
+    except (OSError, ValueError) as e:
+        # The entries parsed fine; only the next load pays for the failed write
+        METRICS.count("cache writes skipped")
+        METRICS.detail(f"⚠️ Could not cache {key}: {e}")
+    return entries
+
+
+def _composer_timeline(conn, key, cache=None):
+    try:
+        return key, session_timeline(conn, key, composer_id_from_key(key), cache), None
+    except Exception as e:
+        return key, [], str(e)
+
+
+def _load_composer_timeline(job):
+    # Runs in a worker process: each worker streams its own session from the
+    # database, so blobs never travel between processes, only the entries do.
+    # The counters of this session go back with them for the parent to merge.
+    db_path, key, cache_path = job
+    METRICS.reset()
+    conn = connect(db_path)
+    try:
+        cache = TimelineCache(cache_path) if cache_path else None
+        return (*_composer_timeline(conn, key, cache), METRICS.counters)
+    finally:
+        conn.close()
+
+
+def load_largest_timeline(use_backup=False, db=None, use_cache=True, progress=None):
+    # The largest session's timeline, untagged like iter_largest_conversation's.
+    # progress(stage, done, total) is called every PROGRESS_EVERY messages
+    # parsed; an exception raised from it stops the load.
+    own_db = db is None
+    db = db or StateDatabase(use_backup)
+    try:
+        with METRICS.stage("load largest"):
+            key, size = find_largest_composer_key(db.conn)
+            METRICS.info(f"📦 Found largest blob: {key} ({size} bytes)")
+            return session_timeline(db.conn, key, cache=TimelineCache() if use_cache else None, progress=progress)
+    finally:
+        if own_db:
+            db.close()
+
+
+def load_all_timelines(use_backup=False, workers=None, db=None, progress=None, use_cache=True):
+    # progress(stage, done, total) is called after every session; an exception
+    # raised from it stops the load and drops the sessions not yet started.
+    # With use_cache, sessions unchanged since the last load skip JSON decoding.
+    workers = COMPOSER_WORKERS if workers is None else workers
+    own_db = db is None
+    db = db or StateDatabase(use_backup)
+    try:
+        with METRICS.stage("load all timelines"):
+            return _merge_timelines(db, workers, progress, TimelineCache() if use_cache else None)
+    finally:
+        if own_db:
+            db.close()
+
+
+def _merge_timelines(db, workers, progress=None, cache=None):
+    # Workers open db.path themselves: the live database read-only, or the snapshot
+    cache_path = cache.cache_path if cache else None
+    jobs = [(db.path, key, cache_path) for key in iter_composer_keys(db.conn)]
+    if not jobs:
+        raise Exception("No composerData blobs found")
+    METRICS.info(f"📦 Found {len(jobs)} composer sessions")
+
+    timeline = []
+    for _, entries in _load_sessions(jobs, workers, progress, cache, conns={db.path: db.conn}):
+        timeline.extend(entries)
+    if cache:
+        cache.prune()
+
+    # One timeline across every session, oldest first; untimed messages lead
+    timeline.sort(key=lambda e: (e.timestamp or 0, e.composer_id))
+    METRICS.info(f"✅ Merged {len(timeline)} messages from {len(jobs)} sessions")
+    return timeline
+
+
+def _load_sessions(jobs, workers, progress=None, cache=None, conns=None):
+    # (job, entries) for every (db_path, key, cache_path) job that decodes, in
+    # job order. The serial path reads through conns, opening (and closing)
+    # a connection for any database not in it.
+    conns = dict(conns or {})
+    own_conns = []
+    if workers <= 1:
+        def serial():
+            for db_path, key, _ in jobs:
+                if db_path not in conns:
+                    conns[db_path] = connect(db_path)
+                    own_conns.append(conns[db_path])
+                # Counted straight into METRICS, nothing to merge
+                yield (*_composer_timeline(conns[db_path], key, cache), {})
+        results = serial()
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_load_composer_timeline, jobs)
+
+    try:
+        for done, (job, (key, entries, error, counters)) in enumerate(zip(jobs, results), 1):
+            METRICS.merge(counters)
+            if error:
+                print(f"❌ Error decoding {key} in {job[0]}: {error}")
+            else:
+                METRICS.count("sessions parsed")
+                yield job, entries
+            if progress:
+                progress("blobs parsed", done, len(jobs))
+    finally:
+        if workers > 1:
+            pool.shutdown(cancel_futures=True)
+        for conn in own_conns:
+            conn.close()
+
+
+def merge_session_copies(copies):
+    # copies holds the entries of one session as found in several databases.
+    # The copy with the most messages (then the most text) sets the order;
+    # messages only other copies hold are appended, and where copies disagree
+    # on a message the longest text wins.
+    base = max(copies, key=lambda entries: (len(entries), sum(len(e.text) for e in entries)))
+    if len(copies) == 1:
+        return base
+    METRICS.count("duplicate sessions", len(copies) - 1)
+    best = {}
+    for entries in copies:
+        for entry in entries:
+            if entry.message_id and (entry.message_id not in best or len(entry.text) > len(best[entry.message_id].text)):
+                best[entry.message_id] = entry
+
+    merged = []
+    seen = set()
+    for entries in [base] + [e for e in copies if e is not base]:
+        for entry in entries:
+            if not entry.message_id:
+                if entries is base:
+                    merged.append(entry)  # No id to match it by in other copies
+            elif entry.message_id not in seen:
+                seen.add(entry.message_id)
+                merged.append(best[entry.message_id])
+    METRICS.count("messages recovered from other copies", max(0, len(merged) - len(base)))
+    return merged
+
+
+def load_merged_timelines(profile_root=None, workers=None, progress=None, use_cache=True):
+    # One timeline from every state database under the profile (see
+    # discover_databases), all sessions decoded in a single pool. A session
+    # found in several databases is merged by message id (merge_session_copies).
+    workers = COMPOSER_WORKERS if workers is None else workers
+    with METRICS.stage("load merged timelines"):
+        databases = discover_databases(profile_root)
+        if not databases:
+            raise Exception(f"No readable Cursor state database found under {profile_root or PROFILE_ROOT}")
+        METRICS.info(f"🔍 Found {len(databases)} state databases")
+
+        cache = TimelineCache() if use_cache else None
+        cache_path = cache.cache_path if cache else None
+        jobs = []
+        for db_path in databases:
+            conn = connect(db_path)
+            try:
+                found = [(db_path, key, cache_path) for key in iter_composer_keys(conn)]
+            finally:
+                conn.close()
+            METRICS.detail(f"📦 {len(found)} composer sessions in {db_path}")
+            jobs.extend(found)
+        if not jobs:
+            raise Exception("No composerData blobs found")
+
+        # Every copy of a session, grouped by composer id in discovery order
+        copies = {}
+        for (_, key, _), entries in _load_sessions(jobs, workers, progress, cache):
+            copies.setdefault(composer_id_from_key(key), []).append(entries)
+        if cache:
+            cache.prune()
+
+        timeline = []
+        for session_copies in copies.values():
+            timeline.extend(merge_session_copies(session_copies))
+        timeline.sort(key=lambda e: (e.timestamp or 0, e.composer_id))
+        METRICS.info(f"✅ Merged {len(timeline)} messages from {len(copies)} sessions "
+                     f"({len(jobs)} copies in {len(databases)} databases)")
+        return timeline
+
+
+def extract_largest_blob_to_temp_json(use_backup=False):
+    db = None
+    try:
+        db = StateDatabase(use_backup)
+        key, size = find_largest_composer_key(db.conn)
+        METRICS.info(f"📦 Found largest blob: {key} ({size} bytes)")
+
+        temp_path = os.path.join(tempfile.gettempdir(), "full_composer_blob_decoded.json")
+        stream = open_value_stream(db.conn, key)
+        try:
+            with open(temp_path, "wb") as f:
+                while True:
+                    chunk = stream.read(BLOB_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        finally:
+            stream.close()
+        return temp_path
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return None
+    finally:
+        if db:
+            db.close()
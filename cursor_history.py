@@ -0,0 +1,614 @@
+# cursor_history.py v1.0
+# In-memory index of Cursor's History folder and point-in-time file recovery
+
+import os
+import re
+import json
+import stat
+import shutil
+import sqlite3
+import fnmatch
+import hashlib
+import tempfile
+from bisect import bisect_left
+from urllib.parse import unquote, urlparse
+from types import MappingProxyType
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from cursor_metrics import METRICS
+
+# Paths
+HISTORY_PATH = os.path.expanduser("~/Library/Application Support/Cursor/User/History/")
+ORGANIZED_HISTORY = os.path.expanduser("~/CursorRecovered/_organized_history")
+FINAL_RECOVERY = os.path.expanduser("~/CursorRecovered/final")
+HISTORY_CATALOG = os.path.expanduser("~/CursorRecovered/history_catalog.db")
+
+# Bump when the catalog tables change; older catalogs are rebuilt from scratch
+CATALOG_SCHEMA_VERSION = 1
+
+# Bytes read per step when hashing a recovered file against its version
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Threads used to stat and parse History folders; 1 scans serially.
+# The work is I/O bound, so this pays off most on network homes and large trees.
+HISTORY_SCAN_WORKERS = 8
+
+# One saved version of one file, as described by its folder's entries.json
+HistoryVersion = namedtuple("HistoryVersion", ["resource", "timestamp", "entry_id", "source_path"])
+
+# One request and the versions saved from its timestamp up to the next request's
+PromptChanges = namedtuple("PromptChanges", ["request", "versions"])
+
+# One batch recovery job: the files matching project (a resource filter) as
+# they were just before cutoff (epoch ms, exclusive), written to output_path
+RecoveryJob = namedtuple("RecoveryJob", ["project", "cutoff", "output_path"])
+
+
+# --- Resource Filters ---
+# A project filter is a case-insensitive substring of the file's path unless
+# it starts with one of these kinds:
+#   prefix:/Users/me/proj   paths under a directory (~ is expanded)
+#   glob:*/proj/*.py        fnmatch over the whole path; * also crosses /
+#   re:/proj/(src|lib)/     regular expression searched anywhere in the path
+FILTER_KINDS = ("prefix", "glob", "re")
+
+
+def resource_path(resource):
+    # The local path of a file:// resource URI; other schemes stay as they are
+    if resource.startswith("file://"):
+        return unquote(urlparse(resource).path)
+    return resource
+
+
+def resource_filter(spec):
+    # Compiles a project filter into a function of a resource URI; an empty
+    # filter matches everything. Invalid regular expressions raise ValueError.
+    if not spec:
+        return lambda resource: True
+    kind, sep, pattern = spec.partition(":")
+    if not sep or kind not in FILTER_KINDS:
+        needle = spec.lower()
+        return lambda resource: needle in resource.lower()
+    if kind == "prefix":
+        # Whole directories only: prefix:~/code/api leaves out ~/code/api-old
+        prefix = os.path.expanduser(pattern).rstrip("/")
+        return lambda resource: is_under(resource_path(resource), prefix)
+    if kind == "glob":
+        return lambda resource: fnmatch.fnmatchcase(resource_path(resource), pattern)
+    try:
+        regex = re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression {pattern!r}: {e}")
+    return lambda resource: regex.search(resource_path(resource)) is not None
+
+
+def is_under(path, prefix):
+    # Whether path is prefix itself or below it; prefix has no trailing /
+    return path == prefix or path.startswith(prefix + "/")
+
+
+def resource_parts(resource):
+    # Path components of a resource URI, safe to join under an output folder:
+    # no empty, "." or ".." parts, and a Windows drive "c:" becomes "c"
+    path = unquote(urlparse(resource).path) if "://" in resource else resource
+    parts = [part.replace(":", "") for part in path.replace("\\", "/").split("/")]
+    return [part for part in parts if part not in ("", ".", "..")] or ["unnamed"]
+
+
+def common_resource_root(resources):
+    # Deepest directory holding every resource, as path components
+    return os.path.commonprefix([resource_parts(resource)[:-1] for resource in resources])
+
+
+def filter_resources(index, project_name):
+    # Tests each resource once, not each of its versions
+    matches = resource_filter(project_name)
+    verdicts = {}
+    kept = []
+    for version in index:
+        if version.resource not in verdicts:
+            verdicts[version.resource] = matches(version.resource)
+        if verdicts[version.resource]:
+            kept.append(version)
+    return kept
+
+
+# --- History Index ---
+def read_history_folder(folder_path):
+    json_file = os.path.join(folder_path, "entries.json")
+    with open(json_file, "r") as f:
+        data = json.load(f)
+        METRICS.count("json bytes parsed", f.tell())
+
+    if not isinstance(data, dict) or "resource" not in data or "entries" not in data:
+        raise ValueError("Invalid JSON structure")
+
+    resource_path = data["resource"]
+    # One directory read per folder instead of one exists() per entry
+    with os.scandir(folder_path) as it:
+        present = {entry.name for entry in it}
+
+    versions = []
+    for entry in data["entries"]:
+        if not isinstance(entry, dict):
+            continue
+
+        entry_id = entry.get("id")
+        timestamp = entry.get("timestamp")
+        if not entry_id or not timestamp:
+            continue
+
+        if entry_id not in present:
+            METRICS.count("versions skipped")
+            METRICS.detail(f"❌ Missing file: {os.path.join(folder_path, entry_id)}")
+            continue
+
+        versions.append(HistoryVersion(resource_path, timestamp, entry_id, os.path.join(folder_path, entry_id)))
+    return versions
+
+
+def list_history_folders(history_path):
+    # scandir reports the entry type without a stat() per folder.
+    # Sorted so the scan order, and every message it prints, is repeatable.
+    with os.scandir(history_path) as it:
+        return sorted(entry.name for entry in it if entry.is_dir())
+
+
+def map_folders(func, folder_names, workers=None, progress=None):
+    # progress(stage, done, total) is called on this thread after every folder;
+    # an exception raised from it stops the scan and drops the queued folders
+    workers = HISTORY_SCAN_WORKERS if workers is None else workers
+    pool = None
+    if workers <= 1:
+        results = (func(folder_name) for folder_name in folder_names)
+    else:
+        # pool.map hands results back in input order, whatever order the threads finish in
+        pool = ThreadPoolExecutor(max_workers=workers)
+        results = pool.map(func, folder_names)
+
+    try:
+        collected = []
+        for result in results:
+            collected.append(result)
+            METRICS.count("folders scanned")
+            if progress:
+                progress("folders scanned", len(collected), len(folder_names))
+        return collected
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+
+def scan_history_folders(history_path, workers=None, progress=None):
+    def scan(folder_name):
+        try:
+            return read_history_folder(os.path.join(history_path, folder_name)), None
+        except FileNotFoundError:
+            return [], None  # Skip folders without entries.json
+        except Exception as e:
+            return [], e
+
+    index = []
+    folder_names = list_history_folders(history_path)
+    for folder_name, (versions, error) in zip(folder_names, map_folders(scan, folder_names, workers, progress)):
+        if error:
+            print(f"❌ Error processing {folder_name}: {str(error)}")
+        index.extend(versions)
+    return index
+
+
+@METRICS.stage("history index")
+def build_history_index(project_name=None, history_path=None, use_catalog=True, workers=None, progress=None):
+    history_path = history_path or HISTORY_PATH
+    METRICS.info(f"\n🗂️ Indexing History folders in: {history_path}")
+    if not os.path.exists(history_path):
+        print("⚠️ History path does not exist.")
+        return []
+
+    index = None
+    if use_catalog:
+        try:
+            with HistoryCatalog(history_path=history_path) as catalog:
+                catalog.sync(workers, progress)
+                index = catalog.versions()
+        except sqlite3.Error as e:
+            print(f"⚠️ History catalog unavailable ({e}), scanning every folder")
+    if index is None:
+        index = scan_history_folders(history_path, workers, progress)
+
+    if project_name:
+        index = filter_resources(index, project_name)
+
+    # Oldest first; fully ordered so the result never depends on scan order
+    index.sort(key=lambda v: (v.timestamp, v.resource, v.entry_id, v.source_path))
+    METRICS.info(f"✅ Indexed {len(index)} versions")
+    return index
+
+
+# --- History Catalog ---
+# SQLite sidecar remembering what each History folder held the last time it was read.
+# A folder is only re-parsed when its entries.json changes size or mtime.
+class HistoryCatalog:
+    def __init__(self, catalog_path=None, history_path=None):
+        self.catalog_path = catalog_path or HISTORY_CATALOG
+        self.history_path = os.path.abspath(history_path or HISTORY_PATH)
+        os.makedirs(os.path.dirname(self.catalog_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.catalog_path, timeout=30)
+        self._prepare()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _prepare(self):
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+            if meta.get("schema") == str(CATALOG_SCHEMA_VERSION) and meta.get("history_path") == self.history_path:
+                return
+
+            # New catalog, old layout or a different History folder: start over
+            self.conn.execute("DROP TABLE IF EXISTS versions")
+            self.conn.execute("DROP TABLE IF EXISTS folders")
+            self.conn.execute("""
+                CREATE TABLE folders (
+                    folder TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    resource TEXT
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE versions (
+                    folder TEXT NOT NULL,
+                    entry_id TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX versions_folder ON versions (folder)")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("schema", str(CATALOG_SCHEMA_VERSION)), ("history_path", self.history_path)],
+            )
+
+    def sync(self, workers=None, progress=None):
+        known = {
+            folder: (mtime_ns, size)
+            for folder, mtime_ns, size in self.conn.execute("SELECT folder, mtime_ns, size FROM folders")
+        }
+
+        # Runs on the scan threads: stat every folder, parse only the changed ones
+        def check(folder_name):
+            folder_path = os.path.join(self.history_path, folder_name)
+            try:
+                st = os.stat(os.path.join(folder_path, "entries.json"))
+            except FileNotFoundError:
+                return None  # Skip folders without entries.json
+            if known.get(folder_name) == (st.st_mtime_ns, st.st_size):
+                return st, None, None
+            try:
+                return st, read_history_folder(folder_path), None
+            except Exception as e:
+                return st, [], e
+
+        folder_names = list_history_folders(self.history_path)
+        results = map_folders(check, folder_names, workers, progress)
+
+        # SQLite writes stay on this thread, in folder order
+        present = set()
+        changed = 0
+        with self.conn:
+            for folder_name, result in zip(folder_names, results):
+                if result is None:
+                    continue
+                present.add(folder_name)
+
+                st, versions, error = result
+                if versions is None:
+                    METRICS.count("folders unchanged")
+                    continue  # Unchanged since the last sync
+                if error:
+                    # Remember the broken file too, so it is not re-read until it changes
+                    print(f"❌ Error processing {folder_name}: {str(error)}")
+                resource = versions[0].resource if versions else None
+                self._store_folder(folder_name, st, resource, versions)
+                changed += 1
+
+            removed = set(known) - present
+            for folder_name in removed:
+                self.conn.execute("DELETE FROM versions WHERE folder = ?", (folder_name,))
+                self.conn.execute("DELETE FROM folders WHERE folder = ?", (folder_name,))
+
+        METRICS.info(f"📒 Catalog: {len(present)} folders, {changed} re-read, {len(removed)} removed")
+        return changed, len(removed)
+
+    def _store_folder(self, folder_name, st, resource, versions):
+        self.conn.execute("DELETE FROM versions WHERE folder = ?", (folder_name,))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO folders (folder, mtime_ns, size, resource) VALUES (?, ?, ?, ?)",
+            (folder_name, st.st_mtime_ns, st.st_size, resource),
+        )
+        self.conn.executemany(
+            "INSERT INTO versions (folder, entry_id, timestamp) VALUES (?, ?, ?)",
+            [(folder_name, v.entry_id, v.timestamp) for v in versions],
+        )
+
+    def versions(self):
+        rows = self.conn.execute("""
+            SELECT f.resource, v.timestamp, v.entry_id, v.folder
+            FROM versions v JOIN folders f ON f.folder = v.folder
+        """)
+        return [
+            HistoryVersion(resource, timestamp, entry_id, os.path.join(self.history_path, folder, entry_id))
+            for resource, timestamp, entry_id, folder in rows
+        ]
+
+
+def timestamp_folder_name(timestamp):
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime("%Y%m%d_%H%M%S")
+
+
+def copy_version(version, target_path, store=None):
+    # Written under a temp name beside the target and renamed over it, so an
+    # interrupted run never leaves a half-written file under the real name
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path) or ".", prefix=".tmp-")
+    os.close(fd)
+    try:
+        if store:
+            # One stored copy per unique content, linked into place
+            store.add_and_materialize(version.source_path, temp_path)
+        else:
+            # Copy the file with metadata preserved; captured versions come
+            # from a read-only store, but recovered files are meant for editing
+            shutil.copy2(version.source_path, temp_path)
+            mode = os.stat(temp_path).st_mode
+            if not mode & stat.S_IWUSR:
+                os.chmod(temp_path, mode | stat.S_IWUSR)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        raise
+    METRICS.count("files copied")
+    METRICS.count("bytes copied", os.path.getsize(target_path))
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def is_current(version, target_path, store=None):
+    # True when target_path already holds the version's content. Sizes must
+    # match; a matching mtime (copies keep the version's) or a hardlink to the
+    # stored copy settles it without reading, anything else is decided by
+    # hashing both files.
+    try:
+        target = os.stat(target_path)
+    except FileNotFoundError:
+        return False
+    source = os.stat(version.source_path)
+    if target.st_size != source.st_size:
+        return False
+    if target.st_mtime_ns == source.st_mtime_ns:
+        return True
+    if store and store.is_linked(version.source_path, target_path, source):
+        return True
+    METRICS.count("bytes hashed", 2 * source.st_size)
+    return file_digest(target_path) == file_digest(version.source_path)
+
+
+# --- Organize History ---
+# Materializes the index as timestamp folders for browsing by hand.
+# Recovery no longer needs this; it reads straight from the index.
+@METRICS.stage("organize")
+def organize_history_folders(project_name=None, index=None, store=None, output_path=None):
+    METRICS.info("\n🗃️ Organizing History folders...")
+    output_path = output_path or ORGANIZED_HISTORY
+    if index is None:
+        index = build_history_index(project_name)
+
+    # Clear the organized history folder first
+    if os.path.exists(output_path):
+        shutil.rmtree(output_path)
+    os.makedirs(output_path)
+
+    for version in index:
+        correct_filename = os.path.basename(version.resource)
+        target_folder = os.path.join(output_path, timestamp_folder_name(version.timestamp))
+        os.makedirs(target_folder, exist_ok=True)
+
+        # Handle duplicates with numbering
+        target_path = os.path.join(target_folder, correct_filename)
+        counter = 1
+        while os.path.exists(target_path):
+            base, ext = os.path.splitext(correct_filename)
+            target_path = os.path.join(target_folder, f"{base}.{counter}{ext}")
+            counter += 1
+
+        copy_version(version, target_path, store)
+        METRICS.detail(f"✅ {version.entry_id} → {os.path.basename(target_path)}")
+
+    if store:
+        store.print_stats()
+    METRICS.info(f"\n✅ History organized in: {output_path}")
+
+
+# --- Point-in-Time Lookup ---
+# Every version of every file, grouped per resource and sorted by time, so the
+# state of the project at any moment is one binary search per file.
+class VersionTimeline:
+    def __init__(self, index):
+        self.index = sorted(index, key=lambda v: (v.timestamp, v.resource, v.entry_id, v.source_path))
+        self.timestamps = {}
+        self.versions = {}
+        for version in self.index:
+            self.timestamps.setdefault(version.resource, []).append(version.timestamp)
+            self.versions.setdefault(version.resource, []).append(version)
+
+    def at(self, cutoff):
+        # Newest version of each resource saved before cutoff (epoch ms, exclusive)
+        snapshot = {}
+        for resource, stamps in self.timestamps.items():
+            i = bisect_left(stamps, cutoff)
+            if i:
+                snapshot[resource] = self.versions[resource][i - 1]
+        return snapshot
+
+    def at_many(self, cutoffs):
+        # Answers many cutoffs in one merge pass over the time-sorted index,
+        # yielding (cutoff, snapshot) oldest first. snapshot is a read-only
+        # view that moves on with the next cutoff: copy it to keep it.
+        snapshot = {}
+        view = MappingProxyType(snapshot)
+        pos = 0
+        for cutoff in sorted(set(cutoffs)):
+            while pos < len(self.index) and self.index[pos].timestamp < cutoff:
+                version = self.index[pos]
+                snapshot[version.resource] = version
+                pos += 1
+            yield cutoff, view
+
+
+def join_prompt_changes(requests, index):
+    # Merge-joins two time-sorted streams in one pass: requests (anything with
+    # an epoch-ms .timestamp, e.g. the user's TimelineEntries) and History
+    # versions. Yields a PromptChanges per timed request holding the versions
+    # saved at or after it and before the next request; versions saved before
+    # the first request belong to none. Recovering with the request's own
+    # timestamp as cutoff undoes exactly these versions and everything later.
+    versions = iter(index)
+    version = next(versions, None)
+    current = None
+    for request in requests:
+        if not request.timestamp:
+            continue
+        while version is not None and version.timestamp < request.timestamp:
+            if current is not None:
+                current.versions.append(version)
+            version = next(versions, None)
+        if current is not None:
+            yield current
+        current = PromptChanges(request, [])
+
+    if current is not None:
+        while version is not None:
+            current.versions.append(version)
+            version = next(versions, None)
+        yield current
+
+
+def recovery_cutoff(recovery_time):
+    # recovery_time is a naive local time taken from the timeline (second precision),
+    # so every version saved during that second is still in range
+    return (int(recovery_time.timestamp()) + 1) * 1000
+
+
+def select_recovery_files(snapshot, root=None):
+    # Maps each version to its path relative to the output folder: the
+    # resource's own path below root (components, default: the deepest
+    # directory shared by the snapshot). Pass the root of every resource the
+    # timeline knows so the layout stays the same whatever the cutoff.
+    root = common_resource_root(snapshot) if root is None else list(root)
+    chosen = {}
+    for resource, version in snapshot.items():
+        parts = resource_parts(resource)
+        if parts[:len(root)] == root and len(parts) > len(root):
+            parts = parts[len(root):]
+        chosen[os.path.join(*parts)] = version
+    return chosen
+
+
+# --- Recovery Logic ---
+@METRICS.stage("recover")
+def recover_files_up_to(recovery_time, index=None, project_name=None, timeline=None, store=None, progress=None,
+                        output_path=None, cutoff=None):
+    # cutoff (epoch ms, exclusive) overrides the second-precision cutoff of
+    # recovery_time, e.g. a prompt's exact timestamp to undo everything after it
+    output_path = output_path or FINAL_RECOVERY
+    cutoff = recovery_cutoff(recovery_time) if cutoff is None else cutoff
+    if timeline is None:
+        if index is None:
+            index = build_history_index(project_name, progress=progress)
+        timeline = VersionTimeline(index)
+
+    METRICS.info(f"\n✅ Starting Recovery with target date/time: {recovery_time}")
+
+    # First pass: the most recent version of each file before recovery_time
+    seen_files = select_recovery_files(timeline.at(cutoff), common_resource_root(timeline.versions))
+
+    # Second pass: copy only the chosen versions
+    count = write_recovery_files(seen_files, output_path, store, progress)
+    if store:
+        store.print_stats()
+    return count
+
+
+def write_recovery_files(seen_files, output_path, store=None, progress=None):
+    # Rebuilds the original layout under output_path. Files already holding
+    # the right content are left alone, so recovering to the same folder
+    # again only writes what changed.
+    os.makedirs(output_path, exist_ok=True)
+    count = 0
+    for file_name, version in seen_files.items():
+        version_time = datetime.fromtimestamp(version.timestamp / 1000)
+        target_path = os.path.join(output_path, file_name)
+        try:
+            if is_current(version, target_path, store):
+                METRICS.count("files unchanged")
+            else:
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                copy_version(version, target_path, store)
+                METRICS.detail(f"✅ Recovered: {file_name} (from {version_time})")
+        except FileNotFoundError:
+            METRICS.count("versions skipped")
+            print(f"❌ Source file missing: {version.source_path}")
+            continue
+        count += 1
+        if progress:
+            progress("files copied", count, len(seen_files))
+    return count
+
+
+# --- Batch Recovery ---
+@METRICS.stage("batch recover")
+def recover_batch(jobs, index=None, store=None, progress=None):
+    # Answers every RecoveryJob from one History index: each resource is
+    # tested against each distinct filter once, then one merge pass over the
+    # time-sorted index yields the snapshot at every distinct cutoff. Only
+    # then are files copied. Returns the number of files recovered per job.
+    if index is None:
+        index = build_history_index(progress=progress)
+    timeline = VersionTimeline(index)
+
+    matching = {}
+    for project in {job.project for job in jobs}:
+        matches = resource_filter(project)
+        matching[project] = {resource for resource in timeline.versions if matches(resource)}
+        METRICS.count("filters checked", len(timeline.versions))
+
+    METRICS.info(f"\n✅ Starting batch recovery: {len(jobs)} jobs, {len(matching)} filters")
+    snapshots = {cutoff: dict(snapshot) for cutoff, snapshot in timeline.at_many(job.cutoff for job in jobs)}
+    counts = []
+    for done, job in enumerate(jobs, 1):
+        snapshot = snapshots[job.cutoff]
+        chosen = {resource: snapshot[resource] for resource in matching[job.project] if resource in snapshot}
+        root = common_resource_root(matching[job.project])
+        counts.append(write_recovery_files(select_recovery_files(chosen, root), job.output_path, store))
+        METRICS.info(f"✅ Recovered {counts[-1]} files to: {job.output_path}")
+        if progress:
+            progress("jobs recovered", done, len(jobs))
+
+    if store:
+        store.print_stats()
+    return counts
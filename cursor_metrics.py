@@ -0,0 +1,160 @@
+# cursor_metrics.py v1.0
+# Per-stage timers and counters, verbosity-controlled output, a JSON metrics
+# dump and opt-in cProfile/tracemalloc around each top-level stage.
+#
+# Configured from the environment, so the GUI and the step scripts need no flags:
+#   CURSOR_RECOVERY_VERBOSITY  0 quiet, 1 summaries (default), 2 a line per file
+#   CURSOR_RECOVERY_METRICS    write the metrics as JSON to this file at exit
+#   CURSOR_RECOVERY_PROFILE    "cprofile" or "tracemalloc"
+#   CURSOR_RECOVERY_PROFILE_DIR  where cProfile .prof files go (default: cwd)
+
+import os
+import json
+import time
+import atexit
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+# Verbosity levels
+QUIET = 0
+NORMAL = 1
+VERBOSE = 2
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+# Allocation sites kept per stage when tracing with tracemalloc
+TRACEMALLOC_TOP = 10
+
+
+class Metrics:
+    def __init__(self):
+        self.verbosity = NORMAL
+        self.profile = None
+        self.profile_dir = "."
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.stages = {}
+        self.depth = 0
+
+    # --- Output ---
+    def detail(self, message):
+        # One line per file or folder: only printed at VERBOSE
+        if self.verbosity >= VERBOSE:
+            print(message)
+
+    def info(self, message):
+        if self.verbosity >= NORMAL:
+            print(message)
+
+    # --- Counters ---
+    def count(self, name, n=1):
+        # Safe to call from scan threads
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, counters):
+        # Folds in counters a worker process collected
+        with self.lock:
+            for name, n in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    # --- Stages ---
+    @contextmanager
+    def stage(self, name):
+        # Times the block; repeated stages add up. Profiling wraps top-level
+        # stages only, since profilers and tracemalloc peaks do not nest.
+        outermost = self.depth == 0
+        profiler = None
+        if outermost and self.profile == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif outermost and self.profile == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start()
+
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.depth -= 1
+            record = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+            record["calls"] += 1
+            record["seconds"] += elapsed
+
+            if profiler:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, f"{name.replace(' ', '_')}.prof")
+                profiler.dump_stats(path)
+                record["profile"] = os.path.abspath(path)
+            elif outermost and self.profile == "tracemalloc":
+                import tracemalloc
+                peak = tracemalloc.get_traced_memory()[1]
+                top = tracemalloc.take_snapshot().statistics("lineno")[:TRACEMALLOC_TOP]
+                tracemalloc.stop()
+                record["peak_traced_bytes"] = max(record.get("peak_traced_bytes", 0), peak)
+                record["top_allocations"] = [f"{stat.traceback[0]}: {stat.size} bytes" for stat in top]
+
+    # --- Reporting ---
+    def snapshot(self):
+        with self.lock:
+            return {
+                "verbosity": self.verbosity,
+                "profile": self.profile,
+                "stages": {name: dict(record) for name, record in self.stages.items()},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        self.info(f"📊 Metrics written to: {path}")
+
+    def print_summary(self):
+        if self.verbosity < NORMAL or not (self.stages or self.counters):
+            return
+        data = self.snapshot()
+        stages = ", ".join(f"{name} {r['seconds']:.2f}s" for name, r in data["stages"].items())
+        counters = ", ".join(f"{name} {n}" for name, n in data["counters"].items())
+        if stages:
+            print(f"📊 Stages: {stages}")
+        if counters:
+            print(f"📊 Counters: {counters}")
+
+
+# Shared by every module of the tool
+METRICS = Metrics()
+
+
+def configure(verbosity=None, profile=None, profile_dir=None, metrics_path=None):
+    if verbosity is not None:
+        METRICS.verbosity = verbosity
+    if profile is not None:
+        if profile not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {profile!r}, expected one of {PROFILE_MODES}")
+        METRICS.profile = profile
+    if profile_dir is not None:
+        METRICS.profile_dir = profile_dir
+    if metrics_path and multiprocessing.parent_process() is None:
+        # Worker processes import this module too; only the main one writes
+        atexit.register(METRICS.dump, metrics_path)
+
+
+def configure_from_environment():
+    verbosity = os.environ.get("CURSOR_RECOVERY_VERBOSITY")
+    configure(
+        verbosity=int(verbosity) if verbosity else None,
+        profile=os.environ.get("CURSOR_RECOVERY_PROFILE") or None,
+        profile_dir=os.environ.get("CURSOR_RECOVERY_PROFILE_DIR") or None,
+        metrics_path=os.environ.get("CURSOR_RECOVERY_METRICS") or None,
+    )
+
+
+configure_from_environment()
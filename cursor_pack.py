@@ -0,0 +1,298 @@
+# cursor_pack.py v1.0
+# Every version of every History file in one delta-compressed pack. Each
+# file's versions are stored oldest first as a zlib keyframe (the whole file)
+# every KEYFRAME_INTERVAL versions, and line-level deltas against the version
+# before in between. The index at the end is read through mmap, so any
+# version is rebuilt from its keyframe and at most KEYFRAME_INTERVAL - 1
+# deltas, without reading the rest of the pack.
+#
+# File layout (little-endian):
+#   header     magic, format version, keyframe interval, resource and version
+#              counts, index offset, and the History versions it was built from
+#   records    one zlib-compressed keyframe or delta per version
+#   resources  name offset, name length, version count, first version
+#   versions   timestamp, record offset, record length, size, delta chain length
+#   names      every resource URI, UTF-8, back to back
+# A delta is a list of operations on the previous version's lines: copy
+# (first line, line count) or insert (byte count, followed by those bytes).
+
+import os
+import zlib
+import mmap
+import struct
+import difflib
+import tempfile
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from cursor_metrics import METRICS
+
+# Paths
+PACK_PATH = os.path.expanduser("~/CursorRecovered/history.pack")
+
+# Bump when the layout changes; older packs are rebuilt
+PACK_FORMAT_VERSION = 1
+
+# A keyframe every this many versions of a file bounds the deltas applied to
+# rebuild any version
+KEYFRAME_INTERVAL = 16
+
+# Versions larger than this are always stored whole: line matching costs
+# more than it saves on big or binary files
+DELTA_MAX_BYTES = 8 * 1024 * 1024
+
+# Rebuilt versions kept in memory by a VersionPack, most recently used last
+PACK_CACHE_SIZE = 32
+
+MAGIC = b"CRVPACK\0"
+HEADER = struct.Struct("<8sIIQQQQq")  # magic, version, interval, resources, versions, index offset, source versions, newest
+RESOURCE = struct.Struct("<QIIQ")  # name offset, name length, version count, first version
+VERSION = struct.Struct("<qQQQI4x")  # timestamp, record offset, record length, size, chain length (0 = keyframe)
+OP = struct.Struct("<BQQ")  # kind, then first line and count (copy) or byte count and 0 (insert)
+OP_COPY = 0
+OP_INSERT = 1
+
+# One version in a pack; number is its position in the pack's version table
+PackVersion = namedtuple("PackVersion", ["resource", "timestamp", "size", "number"])
+
+
+def split_lines(data):
+    return data.splitlines(keepends=True)
+
+
+def encode_delta(old_lines, new_lines):
+    # The operations turning old_lines into new_lines
+    parts = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            parts.append(OP.pack(OP_COPY, i1, i2 - i1))
+        elif j2 > j1:
+            inserted = b"".join(new_lines[j1:j2])
+            parts.append(OP.pack(OP_INSERT, len(inserted), 0))
+            parts.append(inserted)
+    return b"".join(parts)
+
+
+def apply_delta(old_lines, delta):
+    lines = []
+    pos = 0
+    while pos < len(delta):
+        kind, a, b = OP.unpack_from(delta, pos)
+        pos += OP.size
+        if kind == OP_COPY:
+            lines.extend(old_lines[a:a + b])
+        else:
+            lines.extend(split_lines(delta[pos:pos + a]))
+            pos += a
+    return lines
+
+
+def group_versions(index):
+    # resource → its versions oldest first, resources in name order
+    by_resource = {}
+    for version in index:
+        by_resource.setdefault(version.resource, []).append(version)
+    return {resource: sorted(versions, key=lambda v: (v.timestamp, v.entry_id))
+            for resource, versions in sorted(by_resource.items())}
+
+
+@METRICS.stage("pack")
+def write_pack(index, pack_path=None, keyframe_interval=KEYFRAME_INTERVAL, progress=None):
+    # Packs every version in the History index; returns how many were packed.
+    # Only one file's previous version is held in memory at a time. Written
+    # under a temp name and renamed, so readers never see half a pack.
+    pack_path = pack_path or PACK_PATH
+    output_dir = os.path.dirname(os.path.abspath(pack_path))
+    os.makedirs(output_dir, exist_ok=True)
+    grouped = group_versions(index)
+    newest = max((v.timestamp for v in index), default=0)
+
+    resources = []
+    versions = []
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, PACK_FORMAT_VERSION, keyframe_interval, 0, 0, 0, 0, 0))
+            offset = HEADER.size
+            for done, (resource, resource_versions) in enumerate(grouped.items(), 1):
+                first = len(versions)
+                previous = None
+                chain = 0
+                for version in resource_versions:
+                    try:
+                        with open(version.source_path, "rb") as source:
+                            data = source.read()
+                    except FileNotFoundError:
+                        METRICS.count("versions skipped")
+                        print(f"❌ Source file missing: {version.source_path}")
+                        continue
+
+                    lines = split_lines(data)
+                    payload = None
+                    if previous is not None and chain + 1 < keyframe_interval and len(data) <= DELTA_MAX_BYTES:
+                        payload = encode_delta(previous, lines)
+                        if len(payload) >= len(data):
+                            payload = None  # A rewrite: the whole file is smaller
+                    if payload is None:
+                        payload = data
+                        chain = 0
+                        METRICS.count("keyframes")
+                    else:
+                        chain += 1
+
+                    record = zlib.compress(payload)
+                    f.write(record)
+                    versions.append((version.timestamp, offset, len(record), len(data), chain))
+                    offset += len(record)
+                    previous = lines if len(data) <= DELTA_MAX_BYTES else None
+                    METRICS.count("versions packed")
+                    METRICS.count("bytes packed", len(data))
+
+                if len(versions) > first:
+                    resources.append((resource, len(versions) - first, first))
+                if progress:
+                    progress("files packed", done, len(grouped))
+
+            # Index: the resource and version tables, then the names they point into
+            index_offset = offset
+            names = []
+            name_offset = 0
+            for resource, count, first in resources:
+                name = resource.encode("utf-8")
+                f.write(RESOURCE.pack(name_offset, len(name), count, first))
+                names.append(name)
+                name_offset += len(name)
+            for row in versions:
+                f.write(VERSION.pack(*row))
+            f.writelines(names)
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, PACK_FORMAT_VERSION, keyframe_interval, len(resources), len(versions),
+                                index_offset, len(index), newest))
+        os.replace(temp_path, pack_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    size = os.path.getsize(pack_path)
+    METRICS.count("pack bytes", size)
+    METRICS.info(f"📦 Packed {len(versions)} versions of {len(resources)} files into {size} bytes: {pack_path}")
+    return len(versions)
+
+
+def pack_is_current(index, pack_path=None):
+    # Whether the pack was built from this History index, judged by how many
+    # versions it had and the newest timestamp among them
+    try:
+        with open(pack_path or PACK_PATH, "rb") as f:
+            header = f.read(HEADER.size)
+    except OSError:
+        return False
+    if len(header) < HEADER.size:
+        return False
+    magic, version, _, _, _, _, source_versions, newest = HEADER.unpack(header)
+    return ((magic, version, source_versions, newest)
+            == (MAGIC, PACK_FORMAT_VERSION, len(index), max((v.timestamp for v in index), default=0)))
+
+
+class VersionPack:
+    # Read-only view of a pack. Tables are read straight out of the mmap as
+    # needed; rebuilt versions are kept in a small LRU cache, so stepping
+    # through a file's versions in order costs one delta per step.
+    def __init__(self, pack_path=None, cache_size=PACK_CACHE_SIZE):
+        self.pack_path = pack_path or PACK_PATH
+        with open(self.pack_path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) < HEADER.size:
+            self.mm.close()
+            raise ValueError(f"Not a version pack: {self.pack_path}")
+        (magic, version, self.keyframe_interval, self.resource_count, self.version_count,
+         index_offset, _, _) = HEADER.unpack_from(self.mm)
+        if (magic, version) != (MAGIC, PACK_FORMAT_VERSION):
+            self.mm.close()
+            raise ValueError(f"Not a version pack (or an older format): {self.pack_path}")
+        self.resources_offset = index_offset
+        self.versions_offset = index_offset + RESOURCE.size * self.resource_count
+        self.names_offset = self.versions_offset + VERSION.size * self.version_count
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # version number → lines
+        self._resources = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.cache.clear()
+        self.mm.close()
+
+    def _resource_row(self, i):
+        name_offset, name_length, count, first = RESOURCE.unpack_from(self.mm, self.resources_offset + RESOURCE.size * i)
+        start = self.names_offset + name_offset
+        return str(self.mm[start:start + name_length], "utf-8"), count, first
+
+    def _version_row(self, number):
+        return VERSION.unpack_from(self.mm, self.versions_offset + VERSION.size * number)
+
+    def resources(self):
+        # resource → (version count, first version number), read once
+        if self._resources is None:
+            self._resources = {}
+            for i in range(self.resource_count):
+                name, count, first = self._resource_row(i)
+                self._resources[name] = (count, first)
+        return self._resources
+
+    def versions(self, resource):
+        # The resource's versions oldest first; [] when it is not in the pack
+        count, first = self.resources().get(resource, (0, 0))
+        return [self.version(resource, number) for number in range(first, first + count)]
+
+    def version(self, resource, number):
+        timestamp, _, _, size, _ = self._version_row(number)
+        return PackVersion(resource, timestamp, size, number)
+
+    def at(self, resource, cutoff):
+        # The resource's newest version saved before cutoff (epoch ms), or None
+        count, first = self.resources().get(resource, (0, 0))
+        timestamps = [self._version_row(number)[0] for number in range(first, first + count)]
+        i = bisect_left(timestamps, cutoff)
+        return self.version(resource, first + i - 1) if i else None
+
+    def read(self, version):
+        # The content of a PackVersion (or a version number) as bytes
+        number = version.number if isinstance(version, PackVersion) else version
+        return b"".join(self._lines(number))
+
+    def _lines(self, number):
+        if number in self.cache:
+            self.cache.move_to_end(number)
+            return self.cache[number]
+
+        # Start from the keyframe, or from the newest cached version after it
+        chain = self._version_row(number)[4]
+        start = number - chain
+        for candidate in range(number - 1, start - 1, -1):
+            if candidate in self.cache:
+                lines = self.cache[candidate]
+                start = candidate
+                break
+        else:
+            lines = split_lines(self._record(start))
+            METRICS.count("pack keyframes read")
+        for step in range(start + 1, number + 1):
+            lines = apply_delta(lines, self._record(step))
+            METRICS.count("pack deltas applied")
+
+        self.cache[number] = lines
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return lines
+
+    def _record(self, number):
+        _, offset, length, _, _ = self._version_row(number)
+        return zlib.decompress(self.mm[offset:offset + length])
@@ -0,0 +1,504 @@
+# cursor_recovery_cli.py v1.1
+# Headless Cursor Recovery: the four step scripts as one streaming pipeline.
+# Nothing here imports tkinter, so it runs over SSH, in batch jobs and from cron.
+#
+# Usage: python3 cursor_recovery_cli.py [STAGE ...] [options]
+#   organize  step 1: copy every History version into timestamped folders
+#   extract   step 2: save each composerData blob as a .bin file
+#   decode    step 3: write each session's messages as JSON Lines
+#   timeline  step 4: write the request timeline of every session
+#   recover   recover the newest version of each file up to --at, or from
+#             just before the prompt sent at --undo-after
+#   search    print the chat messages matching --query, oldest first
+#   grep      print the History versions containing --containing, oldest first
+#   changes   print each of your prompts with the files saved before the next one
+#   batch     recover several --job FILTER TIME DIR at once from one History scan
+#   export    stream what recover would write into a tar or zip --archive
+#   pack      store every History version in one delta-compressed --pack file
+# With no stage, runs organize and timeline. Chat stages share one pass over
+# the database: each blob is streamed once and nothing is staged on disk
+# unless its stage asks for it.
+# -v prints a line per file, -q only errors; --metrics saves the stage timings
+# and counters as JSON, and --profile runs each stage under cProfile or tracemalloc.
+
+import os
+import sys
+import json
+import argparse
+import contextlib
+from datetime import datetime
+
+from cursor_history import (
+    FINAL_RECOVERY,
+    HISTORY_SCAN_WORKERS,
+    ORGANIZED_HISTORY,
+    RecoveryJob,
+    build_history_index,
+    filter_resources,
+    join_prompt_changes,
+    organize_history_folders,
+    recover_batch,
+    recover_files_up_to,
+    recovery_cutoff,
+    resource_filter,
+)
+from cursor_archive import ARCHIVE_FORMATS, EXPORT_PATH, MANIFEST_NAME, archive_format, export_snapshot
+from cursor_db import (
+    BLOB_CHUNK_SIZE,
+    StateDatabase,
+    iter_composer_keys,
+    iter_conversation,
+    load_all_timelines,
+    load_merged_timelines,
+    message_timestamp,
+    open_value_stream,
+)
+from cursor_metrics import METRICS, PROFILE_MODES, QUIET, VERBOSE, configure
+from cursor_pack import PACK_PATH, write_pack
+from cursor_search import ContentIndex, ConversationIndex
+from cursor_store import ContentStore
+from cursor_watch import with_captured_versions
+
+# Paths
+EXTRACTED_PATH = os.path.expanduser("~/CursorRecovery/Extracted")
+TIMELINE_PATH = os.path.expanduser("~/CursorRecovery/ai_request_timeline.txt")
+
+STAGES = ("organize", "extract", "decode", "timeline", "recover", "search", "grep", "changes", "batch", "export", "pack")
+DEFAULT_STAGES = ("organize", "timeline")
+
+# Blobs smaller than this are drafts and empty sessions; step 2 skipped them too
+MIN_BLOB_SIZE = 2048
+
+
+# --- Chat Stages ---
+# Each stage takes the stream of the stage before it and yields its own, so a
+# blob is pulled through every selected stage before the next one is read.
+def extract_stage(conn, keys, output_dir, min_size=MIN_BLOB_SIZE):
+    # Passes every key on; blobs of at least min_size are also copied to disk
+    os.makedirs(output_dir, exist_ok=True)
+    count = 0
+    for key in keys:
+        stream = open_value_stream(conn, key)
+        try:
+            size = len(stream)
+            if size >= min_size:
+                output_path = os.path.join(output_dir, key.replace(":", "_") + ".bin")
+                with open(output_path, "wb") as f:
+                    for chunk in iter(lambda: stream.read(BLOB_CHUNK_SIZE), b""):
+                        f.write(chunk)
+                count += 1
+                METRICS.count("files copied")
+                METRICS.count("bytes copied", size)
+                METRICS.detail(f"✅ Saved {key} ({size} bytes) → {output_path}")
+        finally:
+            stream.close()
+        yield key
+    METRICS.info(f"📦 {count} composerData blobs saved to: {output_dir}")
+
+
+def message_stage(conn, keys):
+    # Yields (key, message) for every message of every session, in key order
+    for key in keys:
+        try:
+            for item in iter_conversation(conn, key):
+                yield key, item
+        except Exception as e:
+            print(f"❌ Error decoding {key}: {e}")
+
+
+def decode_stage(messages, output_dir):
+    # Passes every message on, writing one <key>.jsonl per session as it goes
+    os.makedirs(output_dir, exist_ok=True)
+    current_key = out = None
+    count = 0
+    try:
+        for key, item in messages:
+            if key != current_key:
+                if out:
+                    out.close()
+                current_key = key
+                out = open(os.path.join(output_dir, key.replace(":", "_") + ".jsonl"), "w", encoding="utf-8")
+                count += 1
+            out.write(json.dumps(item, ensure_ascii=False) + "\n")
+            yield key, item
+    finally:
+        if out:
+            out.close()
+    METRICS.info(f"✅ Decoded {count} sessions into: {output_dir}")
+
+
+def format_request_time(ts):
+    # Same rendering as step 4: local time, or a marker when missing or bad
+    if not ts:
+        return "(no timestamp)"
+    try:
+        return datetime.fromtimestamp(int(str(ts)[:13]) / 1000).strftime("%Y-%m-%d %H:%M:%S")
+    except (ValueError, OverflowError, OSError):
+        return "(invalid timestamp)"
+
+
+def timeline_stage(messages):
+    # Yields one "[time] text" line per message with text
+    for _, item in messages:
+        if not isinstance(item, dict):
+            continue
+        text = (item.get("text") or "").strip()
+        if text:
+            yield f"[{format_request_time(message_timestamp(item) or item.get('timestamp'))}] {text}"
+
+
+def write_timeline(lines, output_path, stdout=None):
+    # "-" writes to stdout; the file is only created once there is a line for it
+    out = None
+    count = 0
+    try:
+        for line in lines:
+            if out is None and output_path == "-":
+                out = stdout or sys.stdout
+            elif out is None:
+                os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+                out = open(output_path, "w", encoding="utf-8")
+            else:
+                out.write("\n\n")
+            out.write(line)
+            count += 1
+    finally:
+        if out is not None and output_path != "-":
+            out.close()
+
+    if count:
+        METRICS.info(f"✅ Extracted {count} AI request(s) → {output_path}")
+    else:
+        print("⚠️ No AI requests found.")
+    return count
+
+
+@METRICS.stage("chat stages")
+def run_chat_stages(db, stages, args, stdout=None):
+    keys = iter_composer_keys(db.conn)
+    if "extract" in stages:
+        keys = extract_stage(db.conn, keys, args.extract_dir, args.min_size)
+
+    if "decode" not in stages and "timeline" not in stages:
+        for _ in keys:
+            pass
+        return
+
+    messages = message_stage(db.conn, keys)
+    if "decode" in stages:
+        messages = decode_stage(messages, args.decode_dir)
+
+    if "timeline" in stages:
+        write_timeline(timeline_stage(messages), args.timeline, stdout)
+    else:
+        for _ in messages:
+            pass
+
+
+@METRICS.stage("merged chat stages")
+def run_merged_stages(stages, args, stdout):
+    # Every session of every state database under the profile, decoded in one
+    # pool and merged by message id; read once for both stages
+    timeline = load_merged_timelines(args.profile_root)
+    if "timeline" in stages:
+        lines = (f"[{format_request_time(entry.timestamp)}] {entry.text}" for entry in timeline)
+        write_timeline(lines, args.timeline, stdout)
+    if "changes" in stages:
+        run_changes(None, args, stdout, timeline)
+
+
+@METRICS.stage("search")
+def run_search(db, args, stdout):
+    # The index is synced first; only sessions changed since the last run are read
+    with ConversationIndex() as index:
+        index.sync(db.conn)
+        hits = index.search(args.query, limit=args.limit, raw=args.fts)
+    for hit in hits:
+        speaker = "You" if hit.from_user else "AI"
+        stdout.write(f"[{format_request_time(hit.timestamp)}] {hit.timestamp} {speaker} {hit.composer_id}: {hit.snippet}\n")
+    METRICS.info(f"🔎 {len(hits)} matching message(s)")
+
+
+@METRICS.stage("changes")
+def run_changes(db, args, stdout, timeline=None):
+    # Prompts of every session and History versions, both oldest first, are
+    # merge-joined in one pass. A prompt's ms timestamp passed to
+    # recover --undo-after restores the files as they were when it was sent.
+    # timeline, when given, is used instead of loading db's sessions.
+    index = history_index(args, containing=False)
+    if timeline is None:
+        timeline = load_all_timelines(db=db)
+    prompts = [entry for entry in timeline if entry.from_user and entry.timestamp]
+    for prompt in join_prompt_changes(prompts, index):
+        request = prompt.request
+        first_line = request.text.split("\n", 1)[0]
+        stdout.write(f"[{format_request_time(request.timestamp)}] {request.timestamp} {request.composer_id}: {first_line}\n")
+        for version in prompt.versions:
+            stdout.write(f"    [{format_request_time(version.timestamp)}] {version.resource}\n")
+    METRICS.info(f"📝 {len(prompts)} prompts joined with {len(index)} History versions")
+
+
+# --- History Stages ---
+def open_store(args):
+    if args.dedup:
+        return ContentStore()
+    if args.hardlink:
+        return ContentStore(link_mode="hardlink")
+    return None
+
+
+@METRICS.stage("grep")
+def find_versions(index, args):
+    # Versions containing --containing; the content index is synced with the
+    # whole History index first, reading only versions it has not seen
+    with ContentIndex() as contents:
+        contents.sync(index)
+        return contents.search(args.containing, regex=args.regex, ignore_case=args.ignore_case,
+                               project_name=args.project or None)
+
+
+def history_index(args, containing=True):
+    # History, plus with --captured the versions cursor_watch.py kept that
+    # Cursor has since pruned; then only --project's files, or with
+    # --containing only the versions that contain it
+    index = build_history_index(workers=args.workers)
+    if args.captured:
+        index = with_captured_versions(index)
+    if containing and args.containing:
+        return find_versions(index, args)
+    return filter_resources(index, args.project) if args.project else index
+
+
+def run_history_stages(stages, args, stdout):
+    # One History index serves every History stage
+    index = history_index(args)
+
+    if "grep" in stages:
+        for version in index:
+            stdout.write(f"[{format_request_time(version.timestamp)}] {version.timestamp} {version.resource}\n")
+
+    store = open_store(args)
+    try:
+        if "organize" in stages:
+            organize_history_folders(index=index, store=store, output_path=args.organized_dir)
+        if "recover" in stages:
+            if store:
+                store.reset_stats()
+            recovery_time, cutoff = recovery_point(args)
+            count = recover_files_up_to(recovery_time, index=index, store=store, output_path=args.recover_dir,
+                                        cutoff=cutoff)
+            METRICS.info(f"✅ Recovered {count} files to: {args.recover_dir}")
+        if "batch" in stages:
+            if store:
+                store.reset_stats()
+            recover_batch(args.jobs, index=index, store=store)
+    finally:
+        if store:
+            store.close()
+
+    if "export" in stages:
+        # Read straight from History into the archive, so no store is involved
+        recovery_time, cutoff = recovery_point(args)
+        out = stdout.buffer if args.archive == "-" else None
+        count = export_snapshot(recovery_time, args.archive, index=index, cutoff=cutoff, fmt=args.archive_format,
+                                with_manifest=args.manifest, out=out)
+        METRICS.info(f"✅ Exported {count} files to: {args.archive}")
+
+    if "pack" in stages:
+        write_pack(index, args.pack)
+
+
+def recovery_point(args):
+    # (recovery_time, exact cutoff or None) from --at or --undo-after
+    if args.undo_after is not None:
+        return datetime.fromtimestamp(args.undo_after / 1000), args.undo_after
+    return args.at, None
+
+
+# --- Command Line ---
+def parse_recovery_time(value):
+    if value == "now":
+        return datetime.now()
+    try:
+        return datetime.strptime(value, "%Y%m%d %H%M%S")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected local time as 'YYYYmmdd HHMMSS', got {value!r}")
+
+
+def parse_job(project, when, output_path):
+    # when is "now", a local 'YYYYmmdd HHMMSS' (everything saved during that
+    # second included) or an exact epoch-ms cutoff such as a prompt's timestamp
+    resource_filter(project)  # Raises ValueError on a bad regex
+    if str(when).isdigit():
+        cutoff = int(when)
+    else:
+        try:
+            cutoff = recovery_cutoff(parse_recovery_time(when))
+        except argparse.ArgumentTypeError as e:
+            raise ValueError(str(e))
+    return RecoveryJob(project, cutoff, os.path.expanduser(output_path))
+
+
+def read_jobs_file(path):
+    # A JSON list of {"project": FILTER, "at": TIME, "output": DIR}
+    with open(path, encoding="utf-8") as f:
+        jobs = json.load(f)
+    if not isinstance(jobs, list):
+        raise ValueError(f"{path}: expected a JSON list of jobs")
+    return [parse_job(job.get("project", ""), job["at"], job["output"]) for job in jobs]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Recover Cursor file history and chat timelines without the GUI.",
+    )
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help=f"stages to run, any of: {', '.join(STAGES)} (default: {' '.join(DEFAULT_STAGES)})")
+
+    db_group = parser.add_argument_group("database")
+    db_choice = db_group.add_mutually_exclusive_group()
+    db_choice.add_argument("--db", metavar="PATH", help="state.vscdb to read (default: the newest of main and backup)")
+    db_choice.add_argument("--main", dest="use_backup", action="store_const", const=False,
+                           help="read the main database")
+    db_choice.add_argument("--backup", dest="use_backup", action="store_const", const=True,
+                           help="read the backup database")
+    db_choice.add_argument("--all-databases", action="store_true",
+                           help="merge the sessions of every state database under the profile (timeline and changes)")
+    db_group.add_argument("--profile-root", metavar="DIR",
+                          help="Cursor's User folder searched by --all-databases (default: the macOS location)")
+    db_group.add_argument("--snapshot", action="store_true", help="read from a private copy of the database")
+
+    history_group = parser.add_argument_group("history")
+    history_group.add_argument("--project", default="", help="only History files whose path contains this name")
+    history_group.add_argument("--captured", action="store_true",
+                               help="also use the versions cursor_watch.py captured that History no longer has")
+    history_group.add_argument("--workers", type=int, default=HISTORY_SCAN_WORKERS,
+                               help=f"threads scanning History folders (default: {HISTORY_SCAN_WORKERS})")
+    link_choice = history_group.add_mutually_exclusive_group()
+    link_choice.add_argument("--dedup", action="store_true", help="store unique contents once and clone them into place")
+    link_choice.add_argument("--hardlink", action="store_true", help="like --dedup, but hardlink instead of cloning")
+    recover_point = history_group.add_mutually_exclusive_group()
+    recover_point.add_argument("--at", type=parse_recovery_time, metavar="'YYYYmmdd HHMMSS'",
+                               help="local time to recover files up to, or now (recover and export stages)")
+    recover_point.add_argument("--undo-after", type=int, metavar="MS",
+                               help="recover files as they were when the prompt with this ms timestamp was sent")
+    history_group.add_argument("--containing", metavar="TEXT",
+                               help="only History versions containing TEXT (grep stage; narrows organize and recover)")
+    history_group.add_argument("--regex", action="store_true", help="read --containing as a regular expression")
+    history_group.add_argument("--ignore-case", action="store_true", help="match --containing in any case")
+    history_group.add_argument("--job", nargs=3, action="append", default=[], metavar=("FILTER", "TIME", "DIR"),
+                               help="a batch job: files matching FILTER (substring, prefix:, glob: or re:) as of TIME "
+                                    "('YYYYmmdd HHMMSS', now or epoch ms) into DIR; repeatable")
+    history_group.add_argument("--jobs", metavar="FILE",
+                               help='batch jobs as a JSON list of {"project": ..., "at": ..., "output": ...}')
+
+    search_group = parser.add_argument_group("search")
+    search_group.add_argument("--query", help="words every matching message contains (search stage)")
+    search_group.add_argument("--fts", action="store_true", help="read --query as an SQLite FTS5 query instead")
+    search_group.add_argument("--limit", type=int, default=1000, help="most matches to print (default: 1000)")
+
+    output_group = parser.add_argument_group("output")
+    output_group.add_argument("--organized-dir", default=ORGANIZED_HISTORY, metavar="DIR")
+    output_group.add_argument("--recover-dir", default=FINAL_RECOVERY, metavar="DIR")
+    output_group.add_argument("--archive", default=EXPORT_PATH, metavar="FILE",
+                              help="archive the export stage writes, or - for stdout (default: %(default)s)")
+    output_group.add_argument("--archive-format", choices=ARCHIVE_FORMATS,
+                              help="archive format (default: from the --archive extension; needed with -)")
+    output_group.add_argument("--pack", default=PACK_PATH, metavar="FILE",
+                              help="version pack the pack stage writes (default: %(default)s)")
+    output_group.add_argument("--no-manifest", dest="manifest", action="store_false",
+                              help=f"leave {MANIFEST_NAME} (path, resource, timestamp and SHA-256 per file) out of the archive")
+    output_group.add_argument("--extract-dir", default=EXTRACTED_PATH, metavar="DIR",
+                              help="where extract saves .bin files and decode saves .jsonl files")
+    output_group.add_argument("--decode-dir", metavar="DIR", help="where decode saves .jsonl files (default: --extract-dir)")
+    output_group.add_argument("--timeline", default=TIMELINE_PATH, metavar="FILE", help="timeline file, or - for stdout")
+    output_group.add_argument("--min-size", type=int, default=MIN_BLOB_SIZE, metavar="BYTES",
+                              help=f"smallest blob extract saves (default: {MIN_BLOB_SIZE})")
+
+    metrics_group = parser.add_argument_group("metrics")
+    verbosity = metrics_group.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", dest="verbosity", action="store_const", const=VERBOSE,
+                           help="print a line for every file and blob")
+    verbosity.add_argument("-q", "--quiet", dest="verbosity", action="store_const", const=QUIET,
+                           help="print only warnings and errors")
+    metrics_group.add_argument("--metrics", metavar="FILE", help="save stage timings and counters as JSON")
+    metrics_group.add_argument("--profile", choices=PROFILE_MODES,
+                               help="profile each stage: cprofile saves <stage>.prof files, "
+                                    "tracemalloc records peak memory and top allocations in the metrics")
+    metrics_group.add_argument("--profile-dir", metavar="DIR", help="where cprofile saves .prof files (default: .)")
+
+    args = parser.parse_args(argv)
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage {unknown[0]!r}, expected any of: {', '.join(STAGES)}")
+    args.stages = [s for s in STAGES if s in (args.stages or DEFAULT_STAGES)]
+    args.decode_dir = args.decode_dir or args.extract_dir
+    for stage in ("recover", "export"):
+        if stage in args.stages and args.at is None and args.undo_after is None:
+            parser.error(f"the {stage} stage needs --at 'YYYYmmdd HHMMSS' or --undo-after MS")
+    if "export" in args.stages:
+        try:
+            archive_format("" if args.archive == "-" else args.archive, args.archive_format)
+        except ValueError as e:
+            parser.error(str(e))
+    if "search" in args.stages and not args.query:
+        parser.error("the search stage needs --query")
+    if "grep" in args.stages and not args.containing:
+        parser.error("the grep stage needs --containing")
+    if args.all_databases and ({"extract", "decode", "search"} & set(args.stages) or args.snapshot):
+        parser.error("--all-databases only works with the timeline and changes stages, without --snapshot")
+    if args.profile_root and not args.all_databases:
+        parser.error("--profile-root needs --all-databases")
+    try:
+        resource_filter(args.project)
+        args.jobs = [parse_job(*job) for job in args.job] + (read_jobs_file(args.jobs) if args.jobs else [])
+    except (OSError, KeyError, ValueError) as e:
+        parser.error(f"bad job: {e}")
+    if "batch" in args.stages and not args.jobs:
+        parser.error("the batch stage needs --job FILTER TIME DIR or --jobs FILE")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure(verbosity=args.verbosity, profile=args.profile, profile_dir=args.profile_dir)
+
+    # With the timeline or search results on stdout, progress messages go to
+    # stderr so the results can be piped on untouched
+    stdout = sys.stdout
+    results_on_stdout = (args.timeline == "-" or ("export" in args.stages and args.archive == "-")
+                         or {"search", "grep", "changes"} & set(args.stages))
+    with contextlib.redirect_stdout(sys.stderr if results_on_stdout else sys.stdout):
+        return run(args, stdout)
+
+
+def run(args, stdout):
+    METRICS.info(f"🚀 Running cursor_recovery_cli.py v1.1: {' '.join(args.stages)}")
+    try:
+        if {"organize", "recover", "grep", "batch", "export", "pack"} & set(args.stages):
+            run_history_stages(args.stages, args, stdout)
+        if args.all_databases and {"timeline", "changes"} & set(args.stages):
+            run_merged_stages(args.stages, args, stdout)
+        elif {"extract", "decode", "timeline", "search", "changes"} & set(args.stages):
+            with StateDatabase(args.use_backup, snapshot=args.snapshot, db_path=args.db) as db:
+                if {"extract", "decode", "timeline"} & set(args.stages):
+                    run_chat_stages(db, args.stages, args, stdout)
+                if "search" in args.stages:
+                    run_search(db, args, stdout)
+                if "changes" in args.stages:
+                    run_changes(db, args, stdout)
+    except KeyboardInterrupt:
+        print("\n❌ Interrupted")
+        return 130
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return 1
+    finally:
+        METRICS.print_summary()
+        if args.metrics:
+            METRICS.dump(args.metrics)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,207 +2,204 @@
 # Cursor Recovery Tool with proper history mapping and file recovery
 
 import os
-import json
+import difflib
 import sqlite3
-import tempfile
-import shutil
 import tkinter as tk
 from tkinter import ttk, messagebox
-from datetime import datetime, timezone
+from datetime import datetime
 import time
 import subprocess
-
-# Paths
-DB_PATH = os.path.expanduser("~/Library/Application Support/Cursor/User/globalStorage/state.vscdb")
-DB_PATH_BACKUP = os.path.expanduser("~/Library/Application Support/Cursor/User/globalStorage/state.vscdb.backup")
-HISTORY_PATH = os.path.expanduser("~/Library/Application Support/Cursor/User/History/")
-ORGANIZED_HISTORY = os.path.expanduser("~/CursorRecovered/_organized_history")
-FINAL_RECOVERY = os.path.expanduser("~/CursorRecovered/final")
+import queue
+import threading
+
+from cursor_history import (
+    ORGANIZED_HISTORY,
+    FINAL_RECOVERY,
+    VersionTimeline,
+    build_history_index,
+    join_prompt_changes,
+    recover_files_up_to,
+    recovery_cutoff,
+    resource_filter,
+)
+from cursor_db import (
+    StateDatabase,
+    connect,
+    discover_databases,
+    load_all_timelines,
+    load_largest_timeline,
+    load_merged_timelines,
+)
+from cursor_metrics import METRICS
+from cursor_pack import VersionPack, pack_is_current, write_pack
+from cursor_search import ConversationIndex
 
 os.makedirs(ORGANIZED_HISTORY, exist_ok=True)
 os.makedirs(FINAL_RECOVERY, exist_ok=True)
 
-# --- STEP 1: Extract Largest Blob from DB ---
-def extract_largest_blob_to_temp_json(use_backup=False):
-    try:
-        db_path = DB_PATH_BACKUP if use_backup else DB_PATH
-        print(f"\n🔍 Opening database: {db_path}")
-        conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-        conn.text_factory = bytes
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT key, LENGTH(value) as size
-            FROM cursorDiskKV
-            WHERE key LIKE 'composerData:%'
-            ORDER BY size DESC
-            LIMIT 1;
-        """)
-        row = cursor.fetchone()
-        if not row:
-            raise Exception("No composerData blobs found")
-
-        key, size = row
-        if isinstance(key, bytes):
-            key = key.decode("utf-8")
-
-        print(f"📦 Found largest blob: {key} ({size} bytes)")
-        cursor.execute("SELECT value FROM cursorDiskKV WHERE key = ?", (key,))
-        blob_row = cursor.fetchone()
-        if not blob_row:
-            raise Exception("Failed to fetch blob data")
-
-        blob = blob_row[0]
-        if not isinstance(blob, bytes):
-            raise Exception("Blob was not returned as bytes")
-
-        decoded = blob.decode("utf-8")
-        temp_path = os.path.join(tempfile.gettempdir(), "full_composer_blob_decoded.json")
-        with open(temp_path, "w", encoding="utf-8") as f:
-            f.write(decoded)
-        return temp_path
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return None
-    finally:
-        conn.close()
-
-# --- Organize History ---
-def organize_history_folders(project_name=None):
-    print("\n🗃️ Organizing History folders...")
-    if not os.path.exists(HISTORY_PATH):
-        print("⚠️ History path does not exist.")
-        return
-
-    # Clear the organized history folder first
-    if os.path.exists(ORGANIZED_HISTORY):
-        shutil.rmtree(ORGANIZED_HISTORY)
-    os.makedirs(ORGANIZED_HISTORY)
-
-    # Iterate over each history folder
-    for folder_name in os.listdir(HISTORY_PATH):
-        folder_path = os.path.join(HISTORY_PATH, folder_name)
-
-        if not os.path.isdir(folder_path):
-            continue  # Skip non-directory items
-
-        json_file = os.path.join(folder_path, "entries.json")
-
-        if not os.path.exists(json_file):
-            continue  # Skip folders without entries.json
-
-        print(f"\n📄 Processing folder: {folder_name}")
+# Database picker entries → use_backup argument (None = newest usable);
+# ALL_DATABASES merges every state database under the profile
+ALL_DATABASES = "all"
+DB_CHOICES = {"Newest": None, "Main": False, "Backup": True, "All": ALL_DATABASES}
 
-        try:
-            # Load JSON data
-            with open(json_file, "r") as f:
-                data = json.load(f)
-
-            if not isinstance(data, dict) or "resource" not in data or "entries" not in data:
-                print(f"⚠️ Invalid JSON structure in {folder_name}")
-                continue
-
-            # Check if resource path contains project name
-            resource_path = data["resource"]
-            if project_name and project_name.lower() not in resource_path.lower():
-                print(f"⏭️ Skipping {folder_name} (not part of project {project_name})")
-                continue
-            correct_filename = os.path.basename(resource_path)
-
-            # Process each file version
-            for entry in data["entries"]:
-                if not isinstance(entry, dict):
-                    continue
-
-                original_filename = entry.get("id")
-                timestamp = entry.get("timestamp")
-
-                if not original_filename or not timestamp:
-                    continue
-
-                original_path = os.path.join(folder_path, original_filename)
-                if not os.path.exists(original_path):
-                    print(f"❌ Missing file: {original_path}")
-                    continue
-
-                # Convert timestamp to folder name
-                timestamp_str = datetime.fromtimestamp(
-                    timestamp / 1000, 
-                    tz=timezone.utc
-                ).strftime("%Y%m%d_%H%M%S")
-
-                # Create timestamp-based folder
-                target_folder = os.path.join(ORGANIZED_HISTORY, timestamp_str)
-                os.makedirs(target_folder, exist_ok=True)
-
-                # Set up target path with original filename
-                target_path = os.path.join(target_folder, correct_filename)
-
-                # Handle duplicates with numbering
-                counter = 1
-                while os.path.exists(target_path):
-                    base, ext = os.path.splitext(correct_filename)
-                    target_path = os.path.join(target_folder, f"{base}.{counter}{ext}")
-                    counter += 1
-
-                # Copy the file with metadata preserved
-                shutil.copy2(original_path, target_path)
-                print(f"✅ {original_filename} → {os.path.basename(target_path)}")
-
-        except Exception as e:
-            print(f"❌ Error processing {folder_name}: {str(e)}")
-            continue
+# How often the Tk thread checks on a background job (ms)
+POLL_MS = 100
+
+# Timeline rows shown per page, and characters of each message shown in its row
+PAGE_SIZE = 500
+PREVIEW_CHARS = 120
 
-    print(f"\n✅ History organized in: {ORGANIZED_HISTORY}")
 
-# --- STEP 2: Recovery Logic ---
-def recover_files_up_to(recovery_time):
-    seen_files = {}  # Change to dict to track latest timestamp for each file
-    count = 0
-    print("\n✅ Starting Recovery with target date/time: ", recovery_time)
+# Raised from a job's progress callback once Cancel is pressed
+class Cancelled(Exception):
+    pass
 
-    # First pass: Find the most recent version of each file before recovery_time
-    for folder_name in sorted(os.listdir(ORGANIZED_HISTORY), reverse=True):
+
+# Builds the History timeline for a project, the number of files "Recover
+# Files" would restore at every timestamp of the loaded entries, and the
+# versions saved after each of your prompts (keyed by position in entries)
+def build_version_timeline(project_name, entries, progress=None):
+    timeline = VersionTimeline(build_history_index(project_name, progress=progress))
+
+    # One pass over History answers every timestamp in the timeline
+    cutoffs = {}
+    for ts, _, _ in entries:
         try:
-            folder_dt = datetime.strptime(folder_name, "%Y%m%d_%H%M%S")
+            cutoffs[ts] = recovery_cutoff(datetime.strptime(ts, "%Y%m%d %H%M%S"))
         except ValueError:
-            print(f"⚠️ Skipping invalid folder: {folder_name}")
             continue
+    # Recovery writes one file per resource
+    counts = {cutoff: len(snapshot) for cutoff, snapshot in timeline.at_many(cutoffs.values())}
+
+    # Prompts oldest first (entries are newest first, so this sort is cheap),
+    # merge-joined with the time-sorted History index in one pass
+    prompts = sorted(
+        (i for i, (_, _, entry) in enumerate(entries) if entry.from_user and entry.timestamp),
+        key=lambda i: entries[i][2].timestamp,
+    )
+    joined = join_prompt_changes((entries[i][2] for i in prompts), timeline.index)
+    changes = {i: prompt.versions for i, prompt in zip(prompts, joined)}
+    return timeline, {ts: counts[cutoff] for ts, cutoff in cutoffs.items()}, changes
+
+# --- Version Browser ---
+class VersionBrowser:
+    # A window over a version pack: the files on the left, the chosen file's
+    # versions on the right and the selected version, or its diff with the
+    # version before, below. Versions are only rebuilt when selected, and the
+    # pack's LRU cache makes stepping through neighbours cheap.
+    def __init__(self, root, pack, project_name=""):
+        self.pack = pack
+        matches = resource_filter(project_name)
+        self.resources = [resource for resource in pack.resources() if matches(resource)]
+        self.versions = []
+
+        self.window = tk.Toplevel(root)
+        self.window.title(f"File Versions ({len(self.resources)} files)")
+        self.window.geometry("1000x650")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.pane = ttk.PanedWindow(self.window, orient=tk.VERTICAL)
+        self.pane.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.lists = ttk.PanedWindow(self.pane, orient=tk.HORIZONTAL)
+        self.pane.add(self.lists, weight=1)
+
+        self.file_frame = ttk.Frame(self.lists)
+        self.file_scrollbar = ttk.Scrollbar(self.file_frame)
+        self.file_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.file_tree = ttk.Treeview(
+            self.file_frame,
+            columns=("file", "versions"),
+            show="headings",
+            selectmode="browse",
+            yscrollcommand=self.file_scrollbar.set
+        )
+        self.file_tree.heading("file", text="File")
+        self.file_tree.heading("versions", text="Versions")
+        self.file_tree.column("file", width=520)
+        self.file_tree.column("versions", width=70, stretch=False)
+        for i, resource in enumerate(self.resources):
+            self.file_tree.insert("", tk.END, iid=str(i), values=(resource, pack.resources()[resource][0]))
+        self.file_tree.bind("<<TreeviewSelect>>", self.show_versions)
+        self.file_tree.pack(fill=tk.BOTH, expand=True)
+        self.file_scrollbar.config(command=self.file_tree.yview)
+        self.lists.add(self.file_frame, weight=3)
+
+        self.version_tree = ttk.Treeview(self.lists, columns=("time", "size"), show="headings", selectmode="browse")
+        self.version_tree.heading("time", text="🕓 Saved")
+        self.version_tree.heading("size", text="Bytes")
+        self.version_tree.column("time", width=150)
+        self.version_tree.column("size", width=80, stretch=False)
+        self.version_tree.bind("<<TreeviewSelect>>", self.show_version)
+        self.lists.add(self.version_tree, weight=1)
+
+        self.view_frame = ttk.Frame(self.pane)
+        self.show_diff = tk.BooleanVar(value=False)
+        self.diff_checkbox = ttk.Checkbutton(
+            self.view_frame,
+            text="Diff with previous version",
+            variable=self.show_diff,
+            command=self.show_version
+        )
+        self.diff_checkbox.pack(anchor=tk.W)
+        self.content_scrollbar = ttk.Scrollbar(self.view_frame)
+        self.content_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.content_text = tk.Text(
+            self.view_frame,
+            wrap=tk.NONE,
+            state="disabled",
+            yscrollcommand=self.content_scrollbar.set
+        )
+        self.content_text.pack(fill=tk.BOTH, expand=True)
+        self.content_scrollbar.config(command=self.content_text.yview)
+        self.pane.add(self.view_frame, weight=2)
 
-        if folder_dt > recovery_time:
-            print(f"⏭️ Skipping future folder: {folder_name}")
-            continue
+    def show_versions(self, event=None):
+        selection = self.file_tree.selection()
+        if not selection:
+            return
+        # Newest first; only the table rows are read, no content yet
+        self.versions = self.pack.versions(self.resources[int(selection[0])])[::-1]
+        self.version_tree.delete(*self.version_tree.get_children())
+        for i, version in enumerate(self.versions):
+            saved = datetime.fromtimestamp(version.timestamp / 1000).strftime("%Y-%m-%d %H:%M:%S")
+            self.version_tree.insert("", tk.END, iid=str(i), values=(saved, version.size))
+        self.set_content("")
+
+    def show_version(self, event=None):
+        selection = self.version_tree.selection()
+        if not selection:
+            return
+        self.set_content(self.version_text(int(selection[0]), self.show_diff.get()))
+
+    def version_text(self, i, diff=False):
+        # The i-th listed version (newest first), or its unified diff with the
+        # version saved before it
+        version = self.versions[i]
+        text = self.pack.read(version).decode("utf-8", errors="replace")
+        if not diff:
+            return text
+        if i + 1 >= len(self.versions):
+            return "(The oldest version in the pack: nothing to compare with)\n\n" + text
+        previous = self.versions[i + 1]
+        old = self.pack.read(previous).decode("utf-8", errors="replace")
+        name = version.resource.rsplit("/", 1)[-1]
+        lines = difflib.unified_diff(
+            old.splitlines(keepends=True),
+            text.splitlines(keepends=True),
+            fromfile=f"{name} @ {datetime.fromtimestamp(previous.timestamp / 1000)}",
+            tofile=f"{name} @ {datetime.fromtimestamp(version.timestamp / 1000)}",
+        )
+        return "".join(lines) or "(No changes from the previous version)"
 
-        folder_path = os.path.join(ORGANIZED_HISTORY, folder_name)
-        
-        # Look for files directly in the folder
-        for file_name in os.listdir(folder_path):
-            if file_name == "entries.json":
-                continue
-                
-            file_path = os.path.join(folder_path, file_name)
-            if os.path.isfile(file_path):
-                # Only store if we haven't seen this file before (since we're going newest to oldest)
-                if file_name not in seen_files:
-                    seen_files[file_name] = {
-                        'path': file_path,
-                        'timestamp': folder_dt
-                    }
-                    print(f"📄 Found version of {file_name} from {folder_dt}")
-
-    # Second pass: Copy the most recent version of each file
-    for file_name, info in seen_files.items():
-        source_path = info['path']
-        target_path = os.path.join(FINAL_RECOVERY, file_name)
-        
-        if os.path.exists(source_path):
-            shutil.copy2(source_path, target_path)
-            count += 1
-            print(f"✅ Recovered: {file_name} (from {info['timestamp']})")
-        else:
-            print(f"❌ Source file missing: {source_path}")
+    def set_content(self, text):
+        self.content_text.config(state="normal")
+        self.content_text.delete(1.0, tk.END)
+        self.content_text.insert(tk.END, text)
+        self.content_text.config(state="disabled")
 
-    return count
+    def close(self):
+        self.pack.close()
+        self.window.destroy()
 
 
 # --- UI ---
@@ -216,13 +213,35 @@ class RecoveryApp:
         self.db_frame = ttk.Frame(root)
         self.db_frame.pack(fill=tk.X, pady=5, padx=10)
         
-        self.use_backup = tk.BooleanVar(value=False)
-        self.backup_checkbox = ttk.Checkbutton(
-            self.db_frame, 
-            text="Use Backup Database", 
-            variable=self.use_backup
+        # "Newest" reads whichever of the main and backup databases was written last
+        self.db_label = ttk.Label(self.db_frame, text="Database:")
+        self.db_label.pack(side=tk.LEFT, padx=(0, 5))
+        self.db_choice = tk.StringVar(value="Newest")
+        self.db_combobox = ttk.Combobox(
+            self.db_frame,
+            textvariable=self.db_choice,
+            values=list(DB_CHOICES),
+            state="readonly",
+            width=8
+        )
+        self.db_combobox.pack(side=tk.LEFT)
+
+        # Read from a private copy, for when Cursor is busy writing
+        self.use_snapshot = tk.BooleanVar(value=False)
+        self.snapshot_checkbox = ttk.Checkbutton(
+            self.db_frame,
+            text="Snapshot",
+            variable=self.use_snapshot
         )
-        self.backup_checkbox.pack(side=tk.LEFT)
+        self.snapshot_checkbox.pack(side=tk.LEFT, padx=(10, 0))
+
+        self.load_all = tk.BooleanVar(value=False)
+        self.load_all_checkbox = ttk.Checkbutton(
+            self.db_frame,
+            text="All Chat Sessions",
+            variable=self.load_all
+        )
+        self.load_all_checkbox.pack(side=tk.LEFT, padx=(10, 0))
 
         # Add Load Database button
         self.load_button = ttk.Button(
@@ -242,112 +261,508 @@ class RecoveryApp:
         self.project_entry = ttk.Entry(self.project_frame)
         self.project_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
-        self.results_frame = ttk.Frame(root)
-        self.results_frame.pack(fill=tk.BOTH, expand=True)
+        # Full-text search over every session; Enter or Find again steps to the next match
+        self.search_frame = ttk.Frame(root)
+        self.search_frame.pack(fill=tk.X, pady=(0, 10), padx=10)
 
+        self.search_label = ttk.Label(self.search_frame, text="Search Chats:")
+        self.search_label.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.search_entry = ttk.Entry(self.search_frame)
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.search_entry.bind("<Return>", self.search_conversations)
+
+        self.search_button = ttk.Button(
+            self.search_frame,
+            text="Find",
+            command=self.search_conversations
+        )
+        self.search_button.pack(side=tk.LEFT, padx=10)
+
+        self.match_label = ttk.Label(self.search_frame, text="", width=28)
+        self.match_label.pack(side=tk.LEFT)
+
+        # Matches of the last search, newest first, and the one on screen.
+        # The index is synced with the database once per load.
+        self.search_query = None
+        self.search_hits = []
+        self.search_pos = 0
+        self.search_synced = False
+        self.entry_positions = {}
+
+        # Timeline: one short row per message, one page at a time, so rendering
+        # costs the same however long the conversation is. The full text of the
+        # selected message is shown below on demand.
+        self.results_pane = ttk.PanedWindow(root, orient=tk.VERTICAL)
+        self.results_pane.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        self.results_frame = ttk.Frame(self.results_pane)
         self.scrollbar = ttk.Scrollbar(self.results_frame)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.results_tree = ttk.Treeview(
+            self.results_frame,
+            columns=("time", "speaker", "preview"),
+            show="headings",
+            selectmode="browse",
+            yscrollcommand=self.scrollbar.set
+        )
+        self.results_tree.heading("time", text="🕓 Time")
+        self.results_tree.heading("speaker", text="Speaker")
+        self.results_tree.heading("preview", text="Message")
+        self.results_tree.column("time", width=130, stretch=False)
+        self.results_tree.column("speaker", width=150, stretch=False)
+        self.results_tree.column("preview", width=760)
+        self.results_tree.pack(fill=tk.BOTH, expand=True)
+        self.scrollbar.config(command=self.results_tree.yview)
+        self.results_pane.add(self.results_frame, weight=3)
+
+        self.detail_text = tk.Text(self.results_pane, wrap=tk.WORD, height=10, state="disabled")
+        self.results_pane.add(self.detail_text, weight=1)
+
+        # Paging controls
+        self.page_frame = ttk.Frame(root)
+        self.page_frame.pack(fill=tk.X, padx=10)
+        self.newer_button = ttk.Button(self.page_frame, text="◀ Newer", command=lambda: self.show_page(self.page - 1))
+        self.newer_button.pack(side=tk.LEFT)
+        self.page_label = ttk.Label(self.page_frame, text="")
+        self.page_label.pack(side=tk.LEFT, padx=10)
+        self.older_button = ttk.Button(self.page_frame, text="Older ▶", command=lambda: self.show_page(self.page + 1))
+        self.older_button.pack(side=tk.LEFT)
+
+        # Index into self.entries of the selected message, and the page on screen
+        self.selected_entry = None
+        self.page = 0
+
+        self.results_tree.bind("<<TreeviewSelect>>", self.handle_select)
+
+        # Live preview of what "Recover Files" would restore for the highlighted time
+        self.preview_label = ttk.Label(root, text="")
+        self.preview_label.pack(pady=(10, 0))
+
+        # History timeline, per-timestamp file counts and the versions saved
+        # after each prompt, built on first use per project
+        self.preview_project = None
+        self.version_timeline = None
+        self.preview_counts = {}
+        self.prompt_changes = {}
+
+        # Progress of the background job, with a way to stop it
+        self.progress_frame = ttk.Frame(root)
+        self.progress_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.progress_label = ttk.Label(self.progress_frame, text="", width=32)
+        self.progress_label.pack(side=tk.LEFT, padx=10)
+        self.cancel_button = ttk.Button(
+            self.progress_frame,
+            text="Cancel",
+            command=self.cancel_job,
+            state="disabled"
+        )
+        self.cancel_button.pack(side=tk.LEFT)
 
-        # Add Text widget configuration for highlighting
-        self.results_text = tk.Text(self.results_frame, yscrollcommand=self.scrollbar.set, wrap=tk.WORD)
-        self.results_text.pack(fill=tk.BOTH, expand=True)
-        self.results_text.tag_configure("highlight", background="yellow")
-        self.scrollbar.config(command=self.results_text.yview)
-        
-        # Track the current highlight
-        self.current_highlight = None
-        
-        # Bind click event to text widget
-        self.results_text.bind("<Button-1>", self.handle_click)
+        # Database and History work runs on a worker thread, one job at a time,
+        # and reports back through this queue so the window never freezes
+        self.entries = []
+        self.job_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.job_running = False
+
+        self.action_frame = ttk.Frame(root)
+        self.action_frame.pack(pady=10)
 
          # Update recover button to be disabled initially
         self.recover_button = ttk.Button(
-            root,
+            self.action_frame,
             text="Recover Files",
             command=self.recover_files,
             state="disabled"  # Initially disabled
         )
-        self.recover_button.pack(pady=10)
-
-    def handle_click(self, event):
-        # Get clicked line
-        index = self.results_text.index(f"@{event.x},{event.y}")
-        linestart = self.results_text.index(f"{index} linestart")
-        lineend = self.results_text.index(f"{index} lineend")
-        line = self.results_text.get(linestart, lineend)
-        
-        # Check if clicked line contains a timestamp
-        if "🕓" in line:
-            # Remove previous highlight
-            if self.current_highlight:
-                self.results_text.tag_remove("highlight", *self.current_highlight)
-            
-            # Add new highlight
-            next_lineend = self.results_text.index(f"{lineend} +1 line")
-            self.current_highlight = (linestart, next_lineend)
-            self.results_text.tag_add("highlight", *self.current_highlight)
+        self.recover_button.pack(side=tk.LEFT, padx=5)
+
+        # Restores the files as they were the moment the selected prompt was sent
+        self.undo_button = ttk.Button(
+            self.action_frame,
+            text="Undo After This Prompt",
+            command=self.undo_after_prompt,
+            state="disabled"
+        )
+        self.undo_button.pack(side=tk.LEFT, padx=5)
+
+        # Every saved version of each file, from the version pack
+        self.browse_button = ttk.Button(
+            self.action_frame,
+            text="Browse File Versions",
+            command=self.browse_versions
+        )
+        self.browse_button.pack(side=tk.LEFT, padx=5)
+
+    def handle_select(self, event):
+        selection = self.results_tree.selection()
+        if not selection:
+            return
+        self.selected_entry = int(selection[0])
+        ts, line, _ = self.entries[self.selected_entry]
+
+        # Full text is only ever rendered for the selected message
+        self.detail_text.config(state="normal")
+        self.detail_text.delete(1.0, tk.END)
+        self.detail_text.insert(tk.END, f"🕓 {ts}\n{line}")
+        self.detail_text.config(state="disabled")
+        self.preview_recovery(ts)
+        if self.version_timeline is not None:
+            self.show_changes(self.selected_entry)
+
+    # --- Background Jobs ---
+    def run_job(self, name, work, on_done, on_error):
+        # work(progress) runs on a worker thread and must not touch Tk;
+        # on_done/on_error are called back on the Tk thread
+        if self.job_running:
+            return False
+        self.job_running = True
+        self.job_callbacks = (on_done, on_error)
+        self.cancel_event.clear()
+        self.set_busy(True)
+        self.progress_label.config(text=name)
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start()
+
+        def progress(stage, done, total):
+            if self.cancel_event.is_set():
+                raise Cancelled()
+            self.job_queue.put(("progress", stage, done, total))
+
+        def run():
+            try:
+                with METRICS.stage(name.lower()):
+                    result = work(progress)
+                METRICS.print_summary()
+                self.job_queue.put(("done", result))
+            except Cancelled:
+                self.job_queue.put(("cancelled", None))
+            except Exception as e:
+                self.job_queue.put(("error", e))
+
+        threading.Thread(target=run, daemon=True).start()
+        self.root.after(POLL_MS, self.poll_job)
+        return True
+
+    def poll_job(self):
+        finished = None
+        while finished is None:
+            try:
+                message = self.job_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                self.show_progress(*message[1:])
+            else:
+                finished = message
 
+        if finished is None:
+            self.root.after(POLL_MS, self.poll_job)
+            return
+
+        self.job_running = False
+        self.set_busy(False)
+        kind, payload = finished
+        on_done, on_error = self.job_callbacks
+        if kind == "cancelled":
+            print("🛑 Cancelled")
+            self.progress_label.config(text="Cancelled")
+        elif kind == "error":
+            self.progress_label.config(text="Failed")
+            on_error(payload)
+        else:
+            self.progress_label.config(text="Done")
+            on_done(payload)
+
+    def show_progress(self, stage, done, total):
+        if total:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", maximum=total, value=done)
+            self.progress_label.config(text=f"{done}/{total} {stage}")
+        else:
+            self.progress_label.config(text=f"{done} {stage}")
+
+    def set_busy(self, busy):
+        if not busy:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", value=0)
+        self.load_button.config(state="disabled" if busy else "normal")
+        self.search_button.config(state="disabled" if busy else "normal")
+        self.browse_button.config(state="disabled" if busy else "normal")
+        idle_recover = "normal" if self.entries else "disabled"
+        self.recover_button.config(state="disabled" if busy else idle_recover)
+        self.undo_button.config(state="disabled" if busy else idle_recover)
+        self.cancel_button.config(state="normal" if busy else "disabled")
+
+    def cancel_job(self):
+        # The worker stops at its next progress report
+        self.cancel_event.set()
+        self.progress_label.config(text="Cancelling...")
+
+    def show_job_error(self, error):
+        print(f"❌ Error: {error}")
+        messagebox.showerror("Error", str(error))
+
+    # --- Recovery Preview ---
+    def highlighted_timestamp(self):
+        if self.selected_entry is None:
+            return None
+        return self.entries[self.selected_entry][0]
+
+    def preview_recovery(self, timestamp_str):
+        project_name = self.project_entry.get().strip()
+        if self.version_timeline is not None and self.preview_project == project_name:
+            self.show_preview(timestamp_str)
+            return
+
+        # First preview for this project: scan History in the background and
+        # fill in the label for whatever is highlighted once it is ready
+        entries = self.entries
+
+        def done(result):
+            self.version_timeline, self.preview_counts, self.prompt_changes = result
+            self.preview_project = project_name
+            self.show_preview(self.highlighted_timestamp())
+            if self.selected_entry is not None:
+                self.show_changes(self.selected_entry)
+
+        if self.run_job(
+            "Scanning History",
+            lambda progress: build_version_timeline(project_name, entries, progress),
+            done,
+            self.show_job_error,
+        ):
+            self.preview_label.config(text="🔎 Scanning History...")
+
+    def show_preview(self, timestamp_str):
+        count = self.preview_counts.get(timestamp_str)
+        if count is None:
+            self.preview_label.config(text="")
+            return
+        scope = f" from project {self.preview_project}" if self.preview_project else ""
+        self.preview_label.config(text=f"🔎 {count} files{scope} would be recovered as of {timestamp_str}")
+
+    def show_changes(self, index):
+        # Lists under the selected prompt the History versions saved between it
+        # and your next prompt: what "Undo After This Prompt" takes back first
+        versions = self.prompt_changes.get(index)
+        if versions is None:
+            return
+        if versions:
+            lines = [f"\n\n📝 {len(versions)} file versions saved before your next prompt:"]
+            for version in versions:
+                version_time = datetime.fromtimestamp(version.timestamp / 1000).strftime("%H:%M:%S")
+                lines.append(f"  {version_time}  {version.resource}")
+        else:
+            lines = ["\n\n📝 No files were saved before your next prompt."]
+        self.detail_text.config(state="normal")
+        self.detail_text.insert(tk.END, "\n".join(lines))
+        self.detail_text.config(state="disabled")
+
+    # --- Load ---
     def load_data(self):
-        print("📥 Extracting conversation from largest blob...")
-        temp_json = extract_largest_blob_to_temp_json(self.use_backup.get())
-        if not temp_json:
-            print("❌ No data extracted.")
+        # Tk variables are read here, on the Tk thread, before the job starts
+        use_backup = DB_CHOICES[self.db_choice.get()]
+        snapshot = self.use_snapshot.get()
+        load_all = self.load_all.get()
+
+        # Entries are parsed one at a time straight out of SQLite; the whole
+        # blob is never held in memory or written to disk. Sessions unchanged
+        # since the last load come from the timeline cache without parsing.
+        def work(progress):
+            entries = []
+            if use_backup is ALL_DATABASES:
+                # Each database is read where it is; the snapshot option does not apply
+                print("📥 Merging every session of every state database...")
+                for entry in load_merged_timelines(progress=progress):
+                    entries.append(self.format_entry(entry))
+                entries.sort(key=lambda x: x[0], reverse=True)
+                return entries
+
+            with StateDatabase(use_backup, snapshot=snapshot) as db:
+                if load_all:
+                    print("📥 Merging every composer session...")
+                    for entry in load_all_timelines(db=db, progress=progress):
+                        entries.append(self.format_entry(entry))
+                else:
+                    print("📥 Loading conversation from largest blob...")
+                    for entry in load_largest_timeline(db=db, progress=progress):
+                        entries.append(self.format_entry(entry))
+            entries.sort(key=lambda x: x[0], reverse=True)
+            return entries
+
+        def done(entries):
+            self.entries = entries
+            self.version_timeline = None  # Preview counts follow the loaded entries
+            self.entry_positions = self.index_positions(entries)
+            self.search_synced = False
+            self.search_query = None
+            self.display_entries()
+
+            # Enable the recovery buttons after a successful load; set_busy ran
+            # before the entries were in place, so it left them disabled
+            self.recover_button.config(state="normal")
+            self.undo_button.config(state="normal")
+            messagebox.showinfo("Success", "Database loaded successfully")
+
+        def failed(error):
+            if isinstance(error, ValueError):
+                print("❌ JSON decode error:", error)
+                return
+            print(f"❌ Error: {error}")
             messagebox.showerror("Error", "No data could be extracted from the database")
-            return
 
+        self.run_job("Loading database", work, done, failed)
 
-        with open(temp_json, "r", encoding="utf-8") as f:
+    def format_entry(self, entry):
+        if entry.timestamp:
+            formatted_time = datetime.fromtimestamp(entry.timestamp / 1000).strftime("%Y%m%d %H%M%S")
+        else:
+            formatted_time = "(No Time)"
+
+        # Merged sessions are tagged so messages can be told apart
+        return (formatted_time, f"{self.speaker_label(entry)}: {entry.text}", entry)
+
+    def display_entries(self):
+        self.selected_entry = None
+        self.show_page(0)
+
+    def show_page(self, page):
+        pages = max(1, -(-len(self.entries) // PAGE_SIZE))
+        self.page = min(max(page, 0), pages - 1)
+        start = self.page * PAGE_SIZE
+        end = min(start + PAGE_SIZE, len(self.entries))
+
+        self.results_tree.delete(*self.results_tree.get_children())
+        for i in range(start, end):
+            ts, _, entry = self.entries[i]
+            self.results_tree.insert("", tk.END, iid=str(i), values=(ts, self.speaker_label(entry), self.preview_text(entry)))
+        if self.selected_entry is not None and start <= self.selected_entry < end:
+            self.results_tree.selection_set(str(self.selected_entry))
+            self.results_tree.see(str(self.selected_entry))
+
+        self.page_label.config(text=f"Page {self.page + 1} of {pages} ({len(self.entries)} messages)")
+        self.newer_button.config(state="normal" if self.page > 0 else "disabled")
+        self.older_button.config(state="normal" if self.page < pages - 1 else "disabled")
+
+    def show_entry(self, index):
+        # Jump to any entry, switching page if needed
+        self.selected_entry = index
+        self.show_page(index // PAGE_SIZE)
+
+    def speaker_label(self, entry):
+        speaker = "👤 You" if entry.from_user else "🤖 AI"
+        return f"{speaker} [{entry.composer_id[:8]}]" if entry.composer_id else speaker
+
+    def preview_text(self, entry):
+        first_line = entry.text.split("\n", 1)[0]
+        if len(first_line) > PREVIEW_CHARS or len(first_line) < len(entry.text):
+            return first_line[:PREVIEW_CHARS] + "…"
+        return first_line
+
+    # --- Search ---
+    def search_conversations(self, event=None):
+        query = self.search_entry.get().strip()
+        if not query or self.job_running:
+            return
+        if query == self.search_query and self.search_hits:
+            self.show_search_hit(self.search_pos + 1)
+            return
+
+        if self.search_synced:
             try:
-                self.raw_data = json.load(f)
-            except json.JSONDecodeError as e:
-                print("❌ JSON decode error:", e)
+                hits = self.find_messages(query)
+            except sqlite3.Error as e:
+                self.show_job_error(e)
                 return
+            self.show_search_results(query, hits)
+            return
 
-        self.entries = []
-        last_valid_ts = None
-        convo = self.raw_data.get("conversation", [])
-
-        for i, item in enumerate(convo):
-            if not isinstance(item, dict):
-                continue
-
-            text = item.get("text", "").strip()
-            if not text:
-                continue
-
-            timing_info = item.get("timingInfo", {})
-            ts = timing_info.get("clientStartTime") or timing_info.get("clientRpcSendTime")
-            if ts:
-                dt = datetime.fromtimestamp(ts / 1000)
-                formatted_time = dt.strftime("%Y%m%d %H%M%S")
-                last_valid_ts = formatted_time
+        # First search since the load: bring the index up to date in the
+        # background, re-reading only the sessions that changed. With "All",
+        # the index covers every state database, merged as the load merges them.
+        use_backup = DB_CHOICES[self.db_choice.get()]
+        snapshot = self.use_snapshot.get()
+
+        def work(progress):
+            if use_backup is ALL_DATABASES:
+                # Each database is read where it is, as the load reads them
+                conns = [connect(path) for path in discover_databases()]
+                try:
+                    with ConversationIndex() as index:
+                        index.sync(*conns, progress=progress)
+                finally:
+                    for conn in conns:
+                        conn.close()
             else:
-                formatted_time = last_valid_ts or "(No Time)"
+                with StateDatabase(use_backup, snapshot=snapshot) as db, ConversationIndex() as index:
+                    index.sync(db.conn, progress=progress)
+            return self.find_messages(query)
 
-            speaker = "👤 You" if item.get("type") == 1 else "🤖 AI"
-            self.entries.append((formatted_time, f"{speaker}: {text}", item))
+        def done(hits):
+            self.search_synced = True
+            self.show_search_results(query, hits)
 
-        self.entries.sort(key=lambda x: x[0], reverse=True)
-        self.display_entries()
-        
-        # Enable recover button after successful load
-        self.recover_button.config(state="normal")
-        messagebox.showinfo("Success", "Database loaded successfully")
+        self.run_job("Indexing conversations", work, done, self.show_job_error)
 
-    def display_entries(self):
-        self.results_text.delete(1.0, tk.END)
-        self.current_highlight = None  # Reset highlight
-        for ts, line, _ in self.entries:
-            self.results_text.insert(tk.END, f"🕓 {ts}\n{line}\n\n")
+    def find_messages(self, query):
+        with ConversationIndex() as index:
+            return index.search(query, newest_first=True)
 
-    def recover_files(self):
-        # Get highlighted timestamp if any
-        if self.current_highlight:
-            line = self.results_text.get(*self.current_highlight).split('\n')[0]
-            timestamp_str = line.replace('🕓 ', '').strip()
+    def show_search_results(self, query, hits):
+        self.search_query = query
+        self.search_hits = hits
+        if hits:
+            self.show_search_hit(0)
         else:
-            # Fall back to most recent entry if nothing selected
-            timestamp_str = self.entries[0][0]
+            self.match_label.config(text="No matches")
+
+    def show_search_hit(self, pos):
+        self.search_pos = pos % len(self.search_hits)
+        hit = self.search_hits[self.search_pos]
+        index = self.entry_positions.get(hit.message_id) if hit.message_id else None
+        if index is None:
+            index = self.entry_positions.get((hit.timestamp, hit.composer_id))
+        if index is None:
+            index = self.entry_positions.get((hit.timestamp, None))
+        self.match_label.config(text=f"Match {self.search_pos + 1} of {len(self.search_hits)}")
+
+        if index is not None:
+            self.show_entry(index)
+            return
+
+        # The match is in a session that is not loaded: show where it is
+        if hit.timestamp:
+            formatted_time = datetime.fromtimestamp(hit.timestamp / 1000).strftime("%Y%m%d %H%M%S")
+        else:
+            formatted_time = "(No Time)"
+        self.detail_text.config(state="normal")
+        self.detail_text.delete(1.0, tk.END)
+        self.detail_text.insert(
+            tk.END,
+            f"🕓 {formatted_time}\n{self.speaker_label(hit)}: {hit.snippet}\n\n"
+            "(Not in the loaded messages; tick \"All Chat Sessions\" and load again to jump to it)"
+        )
+        self.detail_text.config(state="disabled")
+
+    def index_positions(self, entries):
+        # message id → its row, and (timestamp, composer_id) → first row showing
+        # it for messages stored without an id. Entries loaded from the largest
+        # blob alone carry no composer id, so they are keyed on None.
+        positions = {}
+        for i, (_, _, entry) in enumerate(entries):
+            if entry.message_id:
+                positions.setdefault(entry.message_id, i)
+            positions.setdefault((entry.timestamp, entry.composer_id), i)
+        return positions
+
+    # --- Recover ---
+    def recover_files(self):
+        # Get highlighted timestamp if any, falling back to the most recent entry
+        timestamp_str = self.highlighted_timestamp() or self.entries[0][0]
             
         print(f"\n⚙️ Recovering files up to: {timestamp_str}")
         project_name = self.project_entry.get().strip()
@@ -357,16 +772,73 @@ class RecoveryApp:
         else:
             if not messagebox.askyesno("Confirm", "No project name entered. Recover all files?"):
                 return
-        
-        organize_history_folders(project_name)
-        
+
         try:
             recovery_time = datetime.strptime(timestamp_str, "%Y%m%d %H%M%S")
-            count = recover_files_up_to(recovery_time)
-            messagebox.showinfo("Recovery Complete", f"✅ Recovered {count} files to: {FINAL_RECOVERY}")
-            self.root.quit()
         except ValueError as ve:
             print("❌ Failed to parse timestamp for recovery:", ve)
+            return
+
+        self.start_recovery(project_name, recovery_time)
+
+    def undo_after_prompt(self):
+        # Recovers with the prompt's own ms timestamp as cutoff: every version
+        # saved once it was sent (its edits and all later ones) is left out
+        entry = self.entries[self.selected_entry][2] if self.selected_entry is not None else None
+        if entry is None or not entry.from_user or not entry.timestamp:
+            messagebox.showinfo("Undo After This Prompt", "Select one of your prompts in the timeline first.")
+            return
+
+        recovery_time = datetime.fromtimestamp(entry.timestamp / 1000)
+        print(f"\n⚙️ Undoing everything after the prompt sent at: {recovery_time}")
+        project_name = self.project_entry.get().strip()
+
+        if project_name:
+            print(f"🎯 Filtering for project: {project_name}")
+        else:
+            if not messagebox.askyesno("Confirm", "No project name entered. Recover all files?"):
+                return
+
+        self.start_recovery(project_name, recovery_time, cutoff=entry.timestamp)
+
+    def start_recovery(self, project_name, recovery_time, cutoff=None):
+        # Query the History index directly; nothing is staged on disk
+        cached = self.version_timeline if self.preview_project == project_name else None
+        entries = self.entries
+
+        def work(progress):
+            timeline = cached
+            if timeline is None:
+                timeline = build_version_timeline(project_name, entries, progress)[0]
+            return recover_files_up_to(recovery_time, timeline=timeline, progress=progress, cutoff=cutoff)
+
+        def done(count):
+            messagebox.showinfo("Recovery Complete", f"✅ Recovered {count} files to: {FINAL_RECOVERY}")
+            self.root.quit()
+
+        self.run_job("Recovering files", work, done, self.show_job_error)
+
+    # --- Version Browser ---
+    def browse_versions(self):
+        # All of History is packed, so one pack serves every project filter;
+        # it is only rebuilt once History has changed since it was written
+        project_name = self.project_entry.get().strip()
+        try:
+            resource_filter(project_name)
+        except ValueError as e:
+            self.show_job_error(e)
+            return
+
+        def work(progress):
+            index = build_history_index(progress=progress)
+            if not pack_is_current(index):
+                write_pack(index, progress=progress)
+            return VersionPack()
+
+        def done(pack):
+            VersionBrowser(self.root, pack, project_name)
+
+        self.run_job("Packing history", work, done, self.show_job_error)
 
 # --- Run ---
 if __name__ == "__main__":
@@ -0,0 +1,449 @@
+# cursor_search.py v1.2
+# Search sidecars kept in SQLite FTS5 and brought up to date incrementally:
+# every chat message (one changed session at a time) and the contents of every
+# History version (each version file is read once, ever)
+
+import os
+import re
+import sqlite3
+from collections import namedtuple
+
+from cursor_db import (
+    composer_id_from_key,
+    iter_conversation,
+    iter_prefixed_rows,
+    merge_session_copies,
+    open_value_stream,
+    timeline_entries,
+)
+from cursor_history import HistoryVersion, filter_resources
+from cursor_metrics import METRICS
+
+# Paths
+CONVERSATION_INDEX = os.path.expanduser("~/CursorRecovered/conversation_index.db")
+CONTENT_INDEX = os.path.expanduser("~/CursorRecovered/history_content_index.db")
+
+# Bump when the index tables change; older indexes are rebuilt from scratch
+INDEX_SCHEMA_VERSION = 2
+CONTENT_INDEX_SCHEMA_VERSION = 1
+
+# Versions larger than this are not indexed (minified bundles, data files);
+# searches still check them by reading the file
+CONTENT_MAX_BYTES = 4 * 1024 * 1024
+
+# Versions indexed per transaction; a cancelled sync keeps every finished batch
+CONTENT_BATCH_SIZE = 500
+
+# One matching message. timestamp is in ms, as in TimelineEntry; snippet is the
+# matching part of the text with the hits wrapped in «»; message_id is the
+# bubble id, or None for messages stored without one.
+SearchHit = namedtuple("SearchHit", ["timestamp", "from_user", "composer_id", "snippet", "message_id"])
+
+
+def fts_query(text):
+    # Plain words → an FTS5 query matching messages that contain all of them.
+    # Each word is quoted so punctuation is never read as query syntax; a
+    # trailing * still asks for a prefix match.
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*") and len(word) > 1
+        word = word.rstrip("*") if prefix else word
+        terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def indexable(text):
+    # SQLite only stores valid UTF-8: a lone surrogate (an emoji cut in half,
+    # which json.loads accepts) becomes U+FFFD
+    if text is None:
+        return None
+    try:
+        text.encode("utf-8")
+        return text
+    except UnicodeEncodeError:
+        return text.encode("utf-16-le", "surrogatepass").decode("utf-16-le", "replace")
+
+
+def session_signatures(conn):
+    # composer_id → a string that changes whenever the session does. Cursor
+    # rewrites rows with INSERT OR REPLACE, which gives them a new rowid, so
+    # rowids and sizes catch edits as well as new messages. Bubble rows are
+    # summarized in one scan of the key index, without reading their values.
+    bubbles = {}
+    for key, rowid in iter_prefixed_rows(conn, "bubbleId:"):
+        parts = key.split(":")
+        if len(parts) != 3:
+            continue
+        count, newest = bubbles.get(parts[1], (0, 0))
+        bubbles[parts[1]] = (count + 1, max(newest, rowid))
+
+    signatures = {}
+    for key, rowid in iter_prefixed_rows(conn, "composerData:"):
+        stream = open_value_stream(conn, key)
+        try:
+            size = len(stream)
+        finally:
+            stream.close()
+        composer_id = composer_id_from_key(key)
+        count, newest = bubbles.get(composer_id, (0, 0))
+        signatures[composer_id] = (key, f"{rowid}:{size}:{count}:{newest}")
+    return signatures
+
+
+class ConversationIndex:
+    def __init__(self, index_path=None):
+        self.index_path = index_path or CONVERSATION_INDEX
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.index_path, timeout=30)
+        self._prepare()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _prepare(self):
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+            if meta.get("schema") == str(INDEX_SCHEMA_VERSION):
+                return
+
+            # New index or old layout: start over
+            self.conn.execute("DROP TABLE IF EXISTS messages")
+            self.conn.execute("DROP TABLE IF EXISTS entries")
+            self.conn.execute("DROP TABLE IF EXISTS sessions")
+            self.conn.execute("""
+                CREATE TABLE sessions (
+                    composer_id TEXT PRIMARY KEY,
+                    signature TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE entries (
+                    id INTEGER PRIMARY KEY,
+                    composer_id TEXT NOT NULL,
+                    message_id TEXT,
+                    timestamp INTEGER,
+                    from_user INTEGER NOT NULL,
+                    text TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX entries_composer ON entries (composer_id)")
+
+            # The FTS table holds only the search terms; text and the other
+            # columns are read back from entries
+            self.conn.execute("""
+                CREATE VIRTUAL TABLE messages USING fts5(
+                    text, content='entries', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER entries_insert AFTER INSERT ON entries BEGIN
+                    INSERT INTO messages (rowid, text) VALUES (new.id, new.text);
+                END
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER entries_delete AFTER DELETE ON entries BEGIN
+                    INSERT INTO messages (messages, rowid, text) VALUES ('delete', old.id, old.text);
+                END
+            """)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", ("schema", str(INDEX_SCHEMA_VERSION))
+            )
+
+    def sync(self, *conns, progress=None):
+        # Re-reads only the sessions whose signature changed since the last
+        # sync. Each session is committed on its own, so progress(stage, done,
+        # total) may raise to stop early and the next sync carries on from there.
+        # With several databases (such as every one of discover_databases), a
+        # session found in more than one is merged by message id.
+        known = dict(self.conn.execute("SELECT composer_id, signature FROM sessions"))
+        sources = {}  # composer_id → [(conn, key)], one per database holding it
+        current = {}  # composer_id → the signatures of its copies, joined
+        for conn in conns:
+            for composer_id, (key, signature) in session_signatures(conn).items():
+                sources.setdefault(composer_id, []).append((conn, key))
+                current[composer_id] = f"{current[composer_id]}|{signature}" if composer_id in current else signature
+        changed = [cid for cid, signature in current.items() if known.get(cid) != signature]
+
+        for done, composer_id in enumerate(changed, 1):
+            signature = current[composer_id]
+            copies = []
+            for conn, key in sources[composer_id]:
+                try:
+                    copies.append(list(timeline_entries(iter_conversation(conn, key), composer_id)))
+                except Exception as e:
+                    print(f"❌ Error decoding {key}: {e}")
+            # A session no copy of decodes is remembered as indexed with no
+            # messages, so it is not retried until it changes
+            entries = merge_session_copies(copies) if copies else []
+            with self.conn:
+                self.conn.execute("DELETE FROM entries WHERE composer_id = ?", (composer_id,))
+                self.conn.executemany(
+                    "INSERT INTO entries (composer_id, message_id, timestamp, from_user, text) VALUES (?, ?, ?, ?, ?)",
+                    [(composer_id, indexable(e.message_id), e.timestamp, int(e.from_user), indexable(e.text))
+                     for e in entries],
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sessions (composer_id, signature) VALUES (?, ?)", (composer_id, signature)
+                )
+            if progress:
+                progress("sessions indexed", done, len(changed))
+
+        removed = set(known) - set(current)
+        with self.conn:
+            for composer_id in removed:
+                self.conn.execute("DELETE FROM entries WHERE composer_id = ?", (composer_id,))
+                self.conn.execute("DELETE FROM sessions WHERE composer_id = ?", (composer_id,))
+
+        METRICS.info(f"🔎 Search index: {len(current)} sessions, {len(changed)} re-read, {len(removed)} removed")
+        return len(changed), len(removed)
+
+    def search(self, text, limit=1000, newest_first=False, raw=False):
+        # text is plain words unless raw=True, which passes FTS5 query syntax through
+        query = text if raw else fts_query(text)
+        if not query:
+            return []
+        order = "DESC" if newest_first else "ASC"
+        rows = self.conn.execute(f"""
+            SELECT e.timestamp, e.from_user, e.composer_id, snippet(messages, 0, '«', '»', '…', 12), e.message_id
+            FROM messages JOIN entries e ON e.id = messages.rowid
+            WHERE messages MATCH ?
+            ORDER BY e.timestamp {order}, e.id {order}
+            LIMIT ?
+        """, (query, limit))
+        return [SearchHit(ts, bool(from_user), composer_id, snippet, message_id)
+                for ts, from_user, composer_id, snippet, message_id in rows]
+
+
+# --- History Contents ---
+# A {m}, {m,}, {,n} or {m,n} quantifier; any other { is a literal brace
+_QUANTIFIER = re.compile(r"\{(?:\d+(?:,\d*)?|,\d+)\}")
+
+# Inline flags such as (?x) or (?i:...), which change what the literals mean
+_INLINE_FLAGS = re.compile(r"\(\?[aiLmsux-]+[:)]")
+
+# Escapes that stand for a class or a position and take no argument; any
+# other letter or digit escape (\x23, \N{...}, \012, \1) has one
+_SHORTHAND_ESCAPES = "dDwWsSbBAZ"
+
+
+def regex_literals(pattern):
+    # Runs of plain characters every match of pattern must contain, for the
+    # trigram prefilter. Deliberately conservative: anything inside groups or
+    # classes is skipped, and alternation, inline flags or an escape taking
+    # an argument anywhere give up (no prefilter).
+    if _INLINE_FLAGS.search(pattern):
+        return []
+    runs, run = [], ""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            i += 2
+            if depth == 0 and not nxt.isalnum():
+                run += nxt
+                continue
+            if nxt not in _SHORTHAND_ESCAPES:
+                return []
+            runs.append(run)
+            run = ""
+            continue
+        if c == "|":
+            return []
+        if c == "[":
+            runs.append(run)
+            run = ""
+            # Skip the class, including a leading ] or ^]
+            i += 1
+            if i < len(pattern) and pattern[i] == "^":
+                i += 1
+            if i < len(pattern) and pattern[i] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+            continue
+        if c == "{":
+            quantifier = _QUANTIFIER.match(pattern, i)
+            if quantifier:
+                # The quantified character may be absent ({0,n}) or repeated
+                runs.append(run[:-1])
+                run = ""
+                i = quantifier.end()
+                continue
+            if depth == 0:
+                run += c
+        elif c in "*?":
+            run = run[:-1]  # The quantified character may be absent
+            runs.append(run)
+            run = ""
+        elif c in "+.^$)(":
+            runs.append(run)
+            run = ""
+            depth += {"(": 1, ")": -1}.get(c, 0)
+        elif depth == 0:
+            run += c
+        i += 1
+    runs.append(run)
+    return [r for r in runs if len(r) >= 3]
+
+
+def trigram_query(literals):
+    # Each literal as a quoted phrase: the trigram tokenizer matches it as a
+    # substring, case-insensitively
+    return " AND ".join('"' + literal.replace('"', '""') + '"' for literal in literals)
+
+
+def version_matches(version, matcher):
+    try:
+        with open(version.source_path, "r", encoding="utf-8", errors="replace") as f:
+            return matcher(f.read())
+    except FileNotFoundError:
+        return False
+
+
+class ContentIndex:
+    # Trigram index of History version contents. Version files are never
+    # rewritten, so a version is keyed on its path (folder + entry id) and read
+    # once; later syncs only index versions that were not there before.
+    def __init__(self, index_path=None):
+        self.index_path = index_path or CONTENT_INDEX
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.index_path, timeout=30)
+        self._prepare()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _prepare(self):
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+            if meta.get("schema") == str(CONTENT_INDEX_SCHEMA_VERSION):
+                return
+
+            # New index or old layout: start over
+            self.conn.execute("DROP TABLE IF EXISTS contents")
+            self.conn.execute("DROP TABLE IF EXISTS versions")
+            self.conn.execute("""
+                CREATE TABLE versions (
+                    id INTEGER PRIMARY KEY,
+                    source_path TEXT NOT NULL UNIQUE,
+                    resource TEXT NOT NULL,
+                    entry_id TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL,
+                    indexed INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX versions_timestamp ON versions (timestamp)")
+
+            # Contentless: the text stays in the History files and only the
+            # trigrams are stored. Rows of versions that disappear are left
+            # behind, but no longer join to versions, so they never match.
+            self.conn.execute("CREATE VIRTUAL TABLE contents USING fts5(text, content='', tokenize='trigram')")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", ("schema", str(CONTENT_INDEX_SCHEMA_VERSION))
+            )
+
+    def sync(self, index, progress=None):
+        # index is every HistoryVersion (unfiltered: versions missing from it are
+        # dropped). progress(stage, done, total) may raise to stop after a batch.
+        known = {path for path, in self.conn.execute("SELECT source_path FROM versions")}
+        current = {v.source_path for v in index}
+        new = [v for v in index if v.source_path not in known]
+
+        removed = known - current
+        if removed:
+            with self.conn:
+                self.conn.executemany("DELETE FROM versions WHERE source_path = ?", [(p,) for p in removed])
+
+        indexed_bytes = 0
+        for start in range(0, len(new), CONTENT_BATCH_SIZE):
+            with self.conn:
+                for version in new[start:start + CONTENT_BATCH_SIZE]:
+                    indexed_bytes += self._add_version(version)
+            if progress:
+                progress("versions indexed", min(start + CONTENT_BATCH_SIZE, len(new)), len(new))
+
+        METRICS.info(f"🔤 Content index: {len(current)} versions, {len(new)} read ({indexed_bytes} bytes), {len(removed)} removed")
+        return len(new), len(removed)
+
+    def _add_version(self, version):
+        text = None
+        try:
+            if os.path.getsize(version.source_path) <= CONTENT_MAX_BYTES:
+                with open(version.source_path, "r", encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+        except OSError as e:
+            print(f"⚠️ Cannot read {version.source_path}: {e}")
+        cursor = self.conn.execute(
+            "INSERT INTO versions (source_path, resource, entry_id, timestamp, indexed) VALUES (?, ?, ?, ?, ?)",
+            (version.source_path, version.resource, version.entry_id, version.timestamp, int(text is not None)),
+        )
+        if text is None:
+            return 0
+        self.conn.execute("INSERT INTO contents (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+        return len(text)
+
+    def _candidates(self, literals, project_name=None):
+        # Versions that may match: those whose trigrams contain every literal,
+        # plus those too large to index. Without usable literals, every version.
+        columns = "v.resource, v.timestamp, v.entry_id, v.source_path"
+        if literals:
+            rows = self.conn.execute(f"""
+                SELECT {columns} FROM contents c JOIN versions v ON v.id = c.rowid WHERE contents MATCH ?
+                UNION ALL
+                SELECT {columns} FROM versions v WHERE v.indexed = 0
+            """, (trigram_query(literals),))
+        else:
+            rows = self.conn.execute(f"SELECT {columns} FROM versions v")
+        versions = [HistoryVersion(*row) for row in rows]
+        if project_name:
+            versions = filter_resources(versions, project_name)
+        return versions
+
+    def search(self, pattern, regex=False, ignore_case=False, project_name=None):
+        # Every version containing pattern (a substring, or a regex with
+        # regex=True), oldest first. Candidates from the index are confirmed
+        # against the file itself, so results are exact. The hits are
+        # HistoryVersions, so they can be passed to recover_files_up_to as index.
+        if regex:
+            compiled = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+            literals = regex_literals(pattern)
+            matcher = lambda text: compiled.search(text) is not None
+        else:
+            literals = [pattern] if len(pattern) >= 3 else []
+            if ignore_case:
+                needle = pattern.casefold()
+                matcher = lambda text: needle in text.casefold()
+            else:
+                matcher = lambda text: pattern in text
+
+        candidates = self._candidates(literals, project_name)
+        hits = [v for v in candidates if version_matches(v, matcher)]
+        hits.sort(key=lambda v: (v.timestamp, v.resource, v.entry_id, v.source_path))
+        METRICS.info(f"🔤 {len(hits)} of {len(candidates)} candidate versions match {pattern!r}")
+        return hits
+
+
+def latest_versions(hits):
+    # resource → the newest of its versions among hits ("the last version
+    # that still had ..."), ordered by resource
+    latest = {}
+    for version in hits:
+        latest[version.resource] = version
+    return dict(sorted(latest.items()))
@@ -0,0 +1,218 @@
+# cursor_store.py v1.0
+# Content-addressed store: each unique file content is kept once and output
+# trees are built from reflinks or hardlinks to it, falling back to copies
+
+import os
+import sys
+import errno
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+
+from cursor_metrics import METRICS
+
+# Paths
+STORE_PATH = os.path.expanduser("~/CursorRecovered/_store")
+
+# Bytes read per hashing step
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# How output files are created from the store, in order of preference:
+#   "auto"     reflink (copy-on-write clone), else copy
+#   "hardlink" hardlink, else copy. Store objects are read-only, but an editor
+#              that writes in place through a hardlink would still change them.
+#   "copy"     always copy
+LINK_MODES = ("auto", "hardlink", "copy")
+
+# Linux FICLONE ioctl: share the extents of another file on btrfs/XFS
+FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    if sys.platform == "darwin":
+        import ctypes
+        libc = ctypes.CDLL("libc.dylib", use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), dst)
+        return
+
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dst)
+            raise
+
+
+class ContentStore:
+    def __init__(self, store_path=None, link_mode="auto"):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {link_mode!r}, expected one of {LINK_MODES}")
+        self.store_path = store_path or STORE_PATH
+        self.objects_path = os.path.join(self.store_path, "objects")
+        self.link_mode = link_mode
+        os.makedirs(self.objects_path, exist_ok=True)
+
+        # Remembers the digest of every source file already hashed, keyed on
+        # its size and mtime, so unchanged History versions are never re-read
+        self.conn = sqlite3.connect(os.path.join(self.store_path, "store.db"), timeout=30)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    digest TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS objects (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL
+                )
+            """)
+
+        self.reset_stats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def reset_stats(self):
+        self.stats = {
+            "versions": 0,         # source files added this session
+            "unique": 0,           # distinct digests among them
+            "new_objects": 0,      # digests not in the store before
+            "logical_bytes": 0,    # bytes the versions would take as full copies
+            "unique_bytes": 0,     # bytes of the distinct contents
+            "hashed_bytes": 0,     # bytes read to hash (cache misses only)
+            "reflinks": 0,
+            "hardlinks": 0,
+            "copies": 0,
+        }
+        self._seen = set()
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_path, digest[:2], digest[2:])
+
+    # --- Adding ---
+    def cached_digest(self, source_path, st=None):
+        # Digest from an earlier add() of the unchanged file, or None
+        st = st or os.stat(source_path)
+        row = self.conn.execute(
+            "SELECT digest FROM sources WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (source_path, st.st_size, st.st_mtime_ns),
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_linked(self, source_path, target_path, st=None):
+        # True when target_path is a hardlink to the stored copy of source_path
+        digest = self.cached_digest(source_path, st)
+        try:
+            return digest is not None and os.path.samefile(target_path, self.object_path(digest))
+        except FileNotFoundError:
+            return False
+
+    def add(self, source_path, st=None):
+        st = st or os.stat(source_path)
+        digest = self.cached_digest(source_path, st)
+        if not digest:
+            digest = self._hash(source_path)
+            self.stats["hashed_bytes"] += st.st_size
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                (source_path, st.st_size, st.st_mtime_ns, digest),
+            )
+
+        if not os.path.exists(self.object_path(digest)):
+            self._store_object(source_path, digest, st.st_size)
+
+        self.stats["versions"] += 1
+        self.stats["logical_bytes"] += st.st_size
+        if digest not in self._seen:
+            self._seen.add(digest)
+            self.stats["unique"] += 1
+            self.stats["unique_bytes"] += st.st_size
+        return digest
+
+    def _hash(self, path):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _store_object(self, source_path, digest, size):
+        target = self.object_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        # Written under a temp name and renamed, so a crash never leaves a
+        # truncated object behind under a valid digest
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.conn.execute("INSERT OR REPLACE INTO objects (digest, size) VALUES (?, ?)", (digest, size))
+        self.stats["new_objects"] += 1
+
+    # --- Output ---
+    def materialize(self, digest, target_path):
+        source = self.object_path(digest)
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+
+        if self.link_mode == "auto":
+            try:
+                _reflink(source, target_path)
+                self.stats["reflinks"] += 1
+                return "reflink"
+            except (OSError, AttributeError):
+                pass  # Filesystem (or platform) without copy-on-write clones
+        elif self.link_mode == "hardlink":
+            try:
+                os.link(source, target_path)
+                self.stats["hardlinks"] += 1
+                return "hardlink"
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+
+        shutil.copyfile(source, target_path)
+        self.stats["copies"] += 1
+        return "copy"
+
+    def add_and_materialize(self, source_path, target_path):
+        st = os.stat(source_path)
+        how = self.materialize(self.add(source_path, st), target_path)
+        if how != "hardlink":
+            # Keep the version's own timestamps, as copy2 did
+            os.utime(target_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        return how
+
+    def print_stats(self):
+        s = self.stats
+        saved = s["logical_bytes"] - s["unique_bytes"]
+        ratio = s["logical_bytes"] / s["unique_bytes"] if s["unique_bytes"] else 1.0
+        METRICS.info(
+            f"🧮 Dedup: {s['versions']} versions → {s['unique']} unique contents "
+            f"({s['new_objects']} new), {s['logical_bytes']} → {s['unique_bytes']} bytes "
+            f"(saved {saved}, {ratio:.1f}x)"
+        )
+        METRICS.info(f"🔗 Output: {s['reflinks']} reflinks, {s['hardlinks']} hardlinks, {s['copies']} copies")
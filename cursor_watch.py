@@ -0,0 +1,561 @@
+# cursor_watch.py v1.1
+# Watch mode: keeps a private, append-only copy of every History version and
+# every changed chat row, so recovery can reach back past what Cursor prunes.
+# Usage: python3 cursor_watch.py [--once] [--history DIR] [--db PATH] [--store DIR]
+#        python3 cursor_watch.py --list-rows [PREFIX] | --extract-row DIGEST OUT | --restore-db OUT
+#
+# On Linux it waits on inotify and sleeps in the kernel while Cursor is idle.
+# A changed entries.json captures only the versions not yet in the store; a
+# write to state.vscdb captures only the composerData and bubbleId rows whose
+# rowid or size changed. --once captures what is there now and exits (any OS).
+# Recover from the captured versions with: cursor_recovery_cli.py --captured
+# Captured chat rows are listed with --list-rows and written back out with
+# --extract-row; --restore-db writes the latest captured value of every row
+# into a state database the chat stages read: cursor_recovery_cli.py --db OUT
+
+import os
+import sys
+import time
+import zlib
+import errno
+import select
+import signal
+import struct
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+
+from cursor_db import BLOB_CHUNK_SIZE, connect, iter_prefixed_rows, open_value_stream, resolve_db_path
+from cursor_history import HISTORY_PATH, HistoryVersion, list_history_folders, read_history_folder
+from cursor_metrics import METRICS
+from cursor_store import ContentStore
+
+# Paths
+CAPTURE_PATH = os.path.expanduser("~/CursorRecovered/capture")
+
+# The store is the only copy of what it holds, so it is never rebuilt: a
+# store with another schema version is refused instead
+CAPTURE_SCHEMA_VERSION = 1
+
+# Chat rows worth keeping every version of
+CAPTURE_PREFIXES = ("composerData:", "bubbleId:")
+
+# Seconds without events before a capture runs, and the longest a pending
+# capture waits while Cursor keeps writing
+DEBOUNCE_S = 2.0
+MAX_DELAY_S = 30.0
+
+# Once the inotify watch limit is reached, History folders left unwatched
+# are rescanned this often instead
+RESCAN_S = 60.0
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+
+class Inotify:
+    # Minimal ctypes binding; Linux only
+    def __init__(self):
+        import ctypes
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "watch mode needs Linux inotify; use --once from a scheduler instead")
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.paths = {}
+
+    def add_watch(self, path, mask):
+        import ctypes
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.paths[wd] = path
+        return wd
+
+    def remove_watch(self, wd):
+        self.libc.inotify_rm_watch(self.fd, wd)
+        self.paths.pop(wd, None)
+
+    def read(self, timeout=None):
+        # (watched path, mask, name) per event; blocks until there is one or
+        # timeout seconds pass. Waiting costs no CPU.
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, pos)
+            name = data[pos + INOTIFY_EVENT.size:pos + INOTIFY_EVENT.size + length].rstrip(b"\0")
+            pos += INOTIFY_EVENT.size + length
+            events.append((self.paths.get(wd), mask, os.fsdecode(name)))
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)  # The watch is gone
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+# --- Capture Store ---
+class CaptureStore:
+    # History versions go into a ContentStore (one copy per unique content);
+    # chat row values are zlib-compressed under their SHA-256. capture.db only
+    # ever gains rows, so every captured state stays reachable.
+    def __init__(self, store_path=None):
+        self.store_path = store_path or CAPTURE_PATH
+        self.rows_path = os.path.join(self.store_path, "rows")
+        os.makedirs(self.rows_path, exist_ok=True)
+        self.files = ContentStore(os.path.join(self.store_path, "files"), link_mode="copy")
+        self.conn = sqlite3.connect(os.path.join(self.store_path, "capture.db"), timeout=30)
+        self._prepare()
+        self.captured_versions = {
+            (resource, entry_id) for resource, entry_id in self.conn.execute("SELECT resource, entry_id FROM versions")
+        }
+        # Latest captured (rowid, size) of every row key
+        self.row_signatures = {
+            key: (rowid, size)
+            for key, rowid, size in self.conn.execute(
+                "SELECT key, row_id, size FROM rows WHERE id IN (SELECT MAX(id) FROM rows GROUP BY key)"
+            )
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.files.close()
+        self.conn.close()
+
+    def _prepare(self):
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            schema = dict(self.conn.execute("SELECT key, value FROM meta")).get("schema")
+            if schema is not None and schema != str(CAPTURE_SCHEMA_VERSION):
+                raise RuntimeError(f"{self.store_path} has capture schema {schema}, this version reads "
+                                   f"{CAPTURE_SCHEMA_VERSION}; move it aside to start a new store")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS versions (
+                    resource TEXT NOT NULL,
+                    entry_id TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    captured INTEGER NOT NULL,
+                    PRIMARY KEY (resource, entry_id)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS rows (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    row_id INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    captured INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS rows_key ON rows (key)")
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('schema', ?)",
+                              (str(CAPTURE_SCHEMA_VERSION),))
+
+    # --- History ---
+    def capture_versions(self, versions):
+        # Copies in the versions not captured before; returns how many
+        captured = 0
+        now = int(time.time() * 1000)
+        with self.conn:
+            for version in versions:
+                if (version.resource, version.entry_id) in self.captured_versions:
+                    continue
+                try:
+                    digest = self.files.add(version.source_path)
+                except FileNotFoundError:
+                    continue  # Pruned by Cursor since entries.json was read
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO versions (resource, entry_id, timestamp, digest, captured) VALUES (?, ?, ?, ?, ?)",
+                    (version.resource, version.entry_id, version.timestamp, digest, now),
+                )
+                self.captured_versions.add((version.resource, version.entry_id))
+                captured += 1
+        self.files.conn.commit()
+        METRICS.count("versions captured", captured)
+        return captured
+
+    def versions(self):
+        # Every captured version, with source_path pointing into the store
+        return [
+            HistoryVersion(resource, timestamp, entry_id, self.files.object_path(digest))
+            for resource, timestamp, entry_id, digest in self.conn.execute(
+                "SELECT resource, timestamp, entry_id, digest FROM versions"
+            )
+        ]
+
+    # --- Chat Rows ---
+    def row_path(self, digest):
+        return os.path.join(self.rows_path, digest[:2], digest[2:] + ".z")
+
+    def capture_row(self, conn, key, rowid, size):
+        # Streams the value through SHA-256 and zlib into a temp file, kept
+        # under its digest unless that content is already stored
+        h = hashlib.sha256()
+        compressor = zlib.compressobj()
+        fd, temp_path = tempfile.mkstemp(dir=self.rows_path, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                stream = open_value_stream(conn, key)
+                try:
+                    for chunk in iter(lambda: stream.read(BLOB_CHUNK_SIZE), b""):
+                        h.update(chunk)
+                        f.write(compressor.compress(chunk))
+                finally:
+                    stream.close()
+                f.write(compressor.flush())
+            digest = h.hexdigest()
+            target = self.row_path(digest)
+            if os.path.exists(target):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temp_path, target)
+                METRICS.count("bytes captured", os.path.getsize(target))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.conn.execute(
+            "INSERT INTO rows (key, row_id, size, digest, captured) VALUES (?, ?, ?, ?, ?)",
+            (key, rowid, size, digest, int(time.time() * 1000)),
+        )
+        self.row_signatures[key] = (rowid, size)
+        METRICS.count("rows captured")
+        return digest
+
+    def rows(self, prefix=""):
+        # (key, captured ms, size, digest) of every captured value of the rows
+        # whose key starts with prefix, oldest first
+        return self.conn.execute(
+            "SELECT key, captured, size, digest FROM rows WHERE substr(key, 1, ?) = ? ORDER BY id",
+            (len(prefix), prefix),
+        ).fetchall()
+
+    def latest_rows(self):
+        # (key, size, digest) of the newest captured value of every row key
+        return self.conn.execute(
+            "SELECT key, size, digest FROM rows WHERE id IN (SELECT MAX(id) FROM rows GROUP BY key) ORDER BY key"
+        ).fetchall()
+
+    def row_chunks(self, digest):
+        # One captured value, decompressed a chunk at a time
+        decompressor = zlib.decompressobj()
+        with open(self.row_path(digest), "rb") as src:
+            for chunk in iter(lambda: src.read(BLOB_CHUNK_SIZE), b""):
+                yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+
+    def extract_row(self, digest, output_path):
+        # Writes one captured value back out
+        with open(output_path, "wb") as dst:
+            for chunk in self.row_chunks(digest):
+                dst.write(chunk)
+
+    def restore_database(self, output_path):
+        # Writes a state database holding the newest captured value of every
+        # row, including sessions Cursor has since deleted; returns how many
+        # rows it holds. Values are streamed in through incremental blob I/O
+        # where available. Written under a temp name and renamed.
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-")
+        os.close(fd)
+        rows = self.latest_rows()
+        try:
+            conn = sqlite3.connect(temp_path)
+            try:
+                with conn:
+                    conn.execute("CREATE TABLE ItemTable (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)")
+                    conn.execute("CREATE TABLE cursorDiskKV (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)")
+                    for key, size, digest in rows:
+                        if not hasattr(conn, "blobopen"):
+                            conn.execute("INSERT INTO cursorDiskKV (key, value) VALUES (?, ?)",
+                                         (key, b"".join(self.row_chunks(digest))))
+                            continue
+                        cursor = conn.execute("INSERT INTO cursorDiskKV (key, value) VALUES (?, zeroblob(?))",
+                                              (key, size))
+                        with conn.blobopen("cursorDiskKV", "value", cursor.lastrowid) as blob:
+                            for chunk in self.row_chunks(digest):
+                                blob.write(chunk)
+            finally:
+                conn.close()
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        METRICS.count("rows restored", len(rows))
+        return len(rows)
+
+
+# --- Capturing ---
+def capture_history(store, history_path, folder_names=None):
+    # folder_names None captures every folder
+    if folder_names is None:
+        folder_names = list_history_folders(history_path)
+    captured = 0
+    for folder_name in folder_names:
+        try:
+            versions = read_history_folder(os.path.join(history_path, folder_name))
+        except FileNotFoundError:
+            continue  # No entries.json (yet)
+        except Exception as e:
+            print(f"❌ Error processing {folder_name}: {e}")
+            continue
+        captured += store.capture_versions(versions)
+    if captured:
+        METRICS.info(f"🗂️ Captured {captured} new History versions")
+    return captured
+
+
+def row_size(conn, rowid):
+    if hasattr(conn, "blobopen"):
+        # The byte size from the row header, without reading the value
+        with conn.blobopen("cursorDiskKV", "value", rowid, readonly=True) as blob:
+            return len(blob)
+    return conn.execute("SELECT LENGTH(CAST(value AS BLOB)) FROM cursorDiskKV WHERE rowid = ?", (rowid,)).fetchone()[0]
+
+
+def capture_database(store, db_path):
+    # Captures every chat row whose (rowid, size) differs from its last capture.
+    # A replaced row gets a new rowid in SQLite, so rewrites are caught even
+    # when the size stays the same.
+    conn = connect(db_path)
+    captured = 0
+    try:
+        with store.conn:
+            for prefix in CAPTURE_PREFIXES:
+                for key, rowid in iter_prefixed_rows(conn, prefix):
+                    try:
+                        size = row_size(conn, rowid)
+                        if store.row_signatures.get(key) != (rowid, size):
+                            store.capture_row(conn, key, rowid, size)
+                            captured += 1
+                    except sqlite3.Error as e:
+                        print(f"⚠️ Skipping {key}: {e}")  # Changed or deleted under us; caught next time
+    finally:
+        conn.close()
+    if captured:
+        METRICS.info(f"💬 Captured {captured} changed chat rows")
+    return captured
+
+
+def with_captured_versions(index, capture_path=None):
+    # The History index plus every captured version Cursor no longer has.
+    # A version still in History keeps its live path.
+    if not os.path.exists(os.path.join(capture_path or CAPTURE_PATH, "capture.db")):
+        print("⚠️ No captured versions yet; run cursor_watch.py first")
+        return index
+    with CaptureStore(capture_path) as store:
+        captured = store.versions()
+    live = {(v.resource, v.entry_id) for v in index}
+    merged = list(index) + [v for v in captured if (v.resource, v.entry_id) not in live]
+    merged.sort(key=lambda v: (v.timestamp, v.resource, v.entry_id, v.source_path))
+    METRICS.info(f"🗄️ {len(merged) - len(index)} captured versions no longer in History")
+    return merged
+
+
+# --- Watching ---
+def watch(store, history_path, db_path):
+    # Runs until interrupted. New History folders are watched as they appear;
+    # the database folder watch is dropped while a capture is pending, so a
+    # busy Cursor costs one wakeup per capture rather than one per write.
+    inotify = Inotify()
+    db_dir, db_name = os.path.split(db_path)
+    db_files = {db_name, db_name + "-wal"}
+    db_mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+    folder_mask = IN_CLOSE_WRITE | IN_MOVED_TO
+    watched = set()
+    unwatched = set()  # Folders past the watch limit, rescanned every RESCAN_S
+    next_rescan = None
+
+    def watch_folder(folder_name):
+        # Returns False once the watch limit is reached; a folder deleted
+        # since it was listed is skipped
+        nonlocal next_rescan
+        if folder_name in watched:
+            return True
+        try:
+            inotify.add_watch(os.path.join(history_path, folder_name), folder_mask)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return True
+            if e.errno != errno.ENOSPC:
+                raise
+            if next_rescan is None:
+                print(f"⚠️ inotify watch limit reached (fs.inotify.max_user_watches); "
+                      f"rescanning unwatched History folders every {RESCAN_S:.0f}s")
+                next_rescan = time.monotonic() + RESCAN_S
+            unwatched.add(folder_name)
+            return False
+        watched.add(folder_name)
+        unwatched.discard(folder_name)
+        return True
+
+    def watch_new_folders():
+        # Folders not watched yet, e.g. created while events were dropped;
+        # returns them all, as their changes may have been missed
+        found = [name for name in list_history_folders(history_path) if name not in watched]
+        for folder_name in found:
+            watch_folder(folder_name)
+        return found
+
+    try:
+        inotify.add_watch(history_path, IN_CREATE | IN_MOVED_TO)
+        watch_new_folders()
+        db_watch = inotify.add_watch(db_dir, db_mask)
+
+        capture_history(store, history_path)
+        capture_database(store, db_path)
+        METRICS.info(f"👀 Watching {history_path} and {db_path}")
+
+        dirty_folders = set()
+        db_dirty = False
+        first_event = last_event = None
+        while True:
+            deadlines = [] if next_rescan is None else [next_rescan]
+            if first_event is not None:
+                deadlines.append(min(last_event + DEBOUNCE_S, first_event + MAX_DELAY_S))
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+            for path, mask, name in inotify.read(timeout):
+                if mask & IN_Q_OVERFLOW:
+                    watch_new_folders()
+                    dirty_folders.update(list_history_folders(history_path))
+                    db_dirty = True
+                elif mask & IN_IGNORED:
+                    if path and os.path.dirname(path) == history_path:
+                        watched.discard(os.path.basename(path))  # Folder removed
+                    continue
+                elif path == history_path and mask & IN_ISDIR:
+                    watch_folder(name)
+                    dirty_folders.add(name)
+                elif path == db_dir:
+                    if name not in db_files:
+                        continue
+                    db_dirty = True
+                    if db_watch is not None:
+                        inotify.remove_watch(db_watch)
+                        db_watch = None
+                elif path and name == "entries.json":
+                    dirty_folders.add(os.path.basename(path))
+                else:
+                    continue
+                now = time.monotonic()
+                first_event = first_event or now
+                last_event = now
+
+            if next_rescan is not None and time.monotonic() >= next_rescan:
+                # Without watches, changes to these folders are only seen here
+                dirty_folders.update(watch_new_folders())
+                dirty_folders.update(unwatched)
+                next_rescan = time.monotonic() + RESCAN_S if unwatched else None
+                if dirty_folders and first_event is None:
+                    first_event = last_event = time.monotonic() - DEBOUNCE_S
+
+            if first_event is None or time.monotonic() < min(last_event + DEBOUNCE_S, first_event + MAX_DELAY_S):
+                continue
+
+            with METRICS.stage("capture"):
+                if dirty_folders:
+                    capture_history(store, history_path, sorted(dirty_folders))
+                if db_dirty:
+                    # Watch again first, so writes during the scan are not missed
+                    db_watch = inotify.add_watch(db_dir, db_mask)
+                    capture_database(store, db_path)
+            dirty_folders = set()
+            db_dirty = False
+            first_event = last_event = None
+    finally:
+        inotify.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Capture new History versions and chat rows as Cursor writes them.")
+    parser.add_argument("--once", action="store_true", help="capture what is there now and exit (works on any OS)")
+    parser.add_argument("--history", default=HISTORY_PATH, metavar="DIR", help="Cursor's History folder")
+    parser.add_argument("--db", metavar="PATH", help="state.vscdb to watch (default: the main database)")
+    parser.add_argument("--store", default=CAPTURE_PATH, metavar="DIR", help=f"capture store (default: {CAPTURE_PATH})")
+    read = parser.add_mutually_exclusive_group()
+    read.add_argument("--list-rows", nargs="?", const="", metavar="PREFIX",
+                      help="list every captured chat row value whose key starts with PREFIX, oldest first")
+    read.add_argument("--extract-row", nargs=2, metavar=("DIGEST", "OUT"), help="write one captured value to OUT")
+    read.add_argument("--restore-db", metavar="OUT",
+                      help="write the newest captured value of every chat row to a state database at OUT")
+    return parser.parse_args(argv)
+
+
+def read_store(store, args):
+    # The read-only commands: nothing is captured
+    if args.list_rows is not None:
+        rows = store.rows(args.list_rows)
+        for key, captured, size, digest in rows:
+            captured_at = datetime.fromtimestamp(captured / 1000).strftime("%Y%m%d %H%M%S")
+            print(f"[{captured_at}] {digest} {size:>10} {key}")
+        METRICS.info(f"💬 {len(rows)} captured row values")
+    elif args.extract_row:
+        digest, output_path = args.extract_row
+        store.extract_row(digest, output_path)
+        METRICS.info(f"📤 Wrote {digest} to {output_path}")
+    else:
+        count = store.restore_database(args.restore_db)
+        METRICS.info(f"🗄️ Restored {count} chat rows to {args.restore_db}; "
+                     f"read them with: cursor_recovery_cli.py --db {args.restore_db}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db_path = args.db or resolve_db_path(False)
+    # Stop cleanly (closing the store) when the service manager asks
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    print(f"🚀 Running cursor_watch.py v1.1 → {args.store}")
+    reading = args.list_rows is not None or args.extract_row or args.restore_db
+    if reading and not os.path.exists(os.path.join(args.store, "capture.db")):
+        print("⚠️ No captured rows yet; run cursor_watch.py first")
+        return 1
+    try:
+        with CaptureStore(args.store) as store:
+            if reading:
+                read_store(store, args)
+            elif args.once:
+                capture_history(store, args.history)
+                capture_database(store, db_path)
+            else:
+                watch(store, os.path.abspath(args.history), db_path)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return 1
+    finally:
+        METRICS.print_summary()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())